@@ -0,0 +1,186 @@
+import os
+import time
+import math
+import threading
+
+# Ước lượng RAM cho một job: audio đã decode + STFT/mel + figure matplotlib
+BASE_JOB_MB = float(os.environ.get("RHYTHM_JOB_BASE_MB", 150))
+MB_PER_AUDIO_SECOND = float(os.environ.get("RHYTHM_JOB_MB_PER_SECOND", 3.0))
+DEFAULT_DURATION = float(os.environ.get("RHYTHM_DEFAULT_DURATION", 300))
+
+
+def estimate_job_mb(duration=None, streaming=False):
+    # Chế độ streaming chỉ giữ vài block trong RAM
+    if streaming:
+        return BASE_JOB_MB
+    return BASE_JOB_MB + MB_PER_AUDIO_SECOND * (duration or DEFAULT_DURATION)
+
+
+# ========== CONCURRENCY + MEMORY BUDGET ==========
+class AdmissionController:
+    """Giới hạn số job chạy cùng lúc và tổng RAM ước lượng; chờ ngắn rồi từ chối."""
+
+    def __init__(self, max_concurrent=2, memory_budget_mb=2048, max_queue=4, queue_timeout=2.0):
+        self.max_concurrent = max_concurrent
+        self.memory_budget_mb = memory_budget_mb
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.reserved_mb = 0.0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "saturated": 0, "too_large": 0, "rate_limited": 0}
+        self.fixed_mb = 0.0
+        self._avg_job_seconds = 10.0
+
+    def _fits(self, mb):
+        return (self.in_flight < self.max_concurrent
+                and self.fixed_mb + self.reserved_mb + mb <= self.memory_budget_mb)
+
+    def reserve_fixed(self, mb):
+        """Trừ hẳn một phần ngân sách cho thứ sống suốt đời worker (vd. pool process của batch)."""
+        with self._cond:
+            self.fixed_mb += mb
+
+    def try_acquire(self, mb):
+        """Trả về (ticket, None) nếu được nhận, hoặc (None, lý do)."""
+        with self._cond:
+            if self.fixed_mb + mb > self.memory_budget_mb:
+                self.rejected["too_large"] += 1
+                return None, "too_large"
+            if not self._fits(mb):
+                if self.queue_depth >= self.max_queue:
+                    self.rejected["queue_full"] += 1
+                    return None, "queue_full"
+                self.queue_depth += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while not self._fits(mb):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected["saturated"] += 1
+                            return None, "saturated"
+                        self._cond.wait(remaining)
+                finally:
+                    self.queue_depth -= 1
+            self.in_flight += 1
+            self.reserved_mb += mb
+            self.admitted += 1
+            return (mb, time.monotonic()), None
+
+    def release(self, ticket):
+        mb, started = ticket
+        with self._cond:
+            self.in_flight -= 1
+            self.reserved_mb -= mb
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * (time.monotonic() - started)
+            self._cond.notify_all()
+
+    def record_rejection(self, reason):
+        with self._cond:
+            self.rejected[reason] += 1
+
+    def retry_after(self):
+        return max(1, int(math.ceil(self._avg_job_seconds)))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "reserved_mb": round(self.reserved_mb, 1),
+                "fixed_mb": round(self.fixed_mb, 1),
+                "queue_depth": self.queue_depth,
+                "max_concurrent": self.max_concurrent,
+                "memory_budget_mb": self.memory_budget_mb,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+            }
+
+
+# ========== PER-CLIENT TOKEN BUCKET ==========
+class RateLimiter:
+    def __init__(self, rate_per_minute=6.0, burst=3):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # bucket đầy lại sau burst / rate giây; quá thời gian đó thì bỏ, lần sau tạo lại y hệt
+        self._idle_after = burst / self.rate if self.rate > 0 else float("inf")
+        self._next_sweep = time.monotonic() + self._idle_after
+
+    def allow(self, client_id, cost=1):
+        """Trả về (True, 0) hoặc (False, số giây cần chờ).
+
+        cost > 1 (batch nhiều bài): chỉ cần còn một token, phần thiếu thành nợ phải trả trước request sau.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            tokens, last = self._buckets.get(client_id, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens >= 1.0:
+                self._buckets[client_id] = (tokens - cost, now)
+                return True, 0
+            self._buckets[client_id] = (tokens, now)
+            return False, max(1, int(math.ceil((1.0 - tokens) / self.rate)))
+
+    def _sweep(self, now):
+        # bucket đã đầy lại (client im lặng đủ lâu): giữ hay bỏ cũng như nhau, bỏ để RAM không tăng mãi
+        self._buckets = {k: (tokens, last) for k, (tokens, last) in self._buckets.items()
+                         if tokens + (now - last) * self.rate < self.burst}
+        self._next_sweep = now + self._idle_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def _box_memory_mb():
+    """RAM của máy (hoặc giới hạn cgroup của container nếu nhỏ hơn); None nếu không đọc được."""
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        if limit.isdigit():
+            total = min(total, int(limit))
+    except OSError:
+        pass
+    return total / 2 ** 20
+
+
+def memory_budget_from_env():
+    """Ngân sách RAM của một worker: RHYTHM_MEMORY_BUDGET_MB nếu đặt, ngược lại
+    RHYTHM_MEMORY_TOTAL_MB (mặc định 75% RAM của máy) chia đều cho RHYTHM_WORKERS worker."""
+    if os.environ.get("RHYTHM_MEMORY_BUDGET_MB"):
+        return float(os.environ["RHYTHM_MEMORY_BUDGET_MB"])
+    total = os.environ.get("RHYTHM_MEMORY_TOTAL_MB")
+    total = float(total) if total else 0.75 * (_box_memory_mb() or 4096)
+    return total / max(1, int(os.environ.get("RHYTHM_WORKERS", 1)))
+
+
+def controller_from_env():
+    controller = AdmissionController(
+        max_concurrent=int(os.environ.get("RHYTHM_MAX_CONCURRENT", 2)),
+        memory_budget_mb=memory_budget_from_env(),
+        max_queue=int(os.environ.get("RHYTHM_MAX_QUEUE", 4)),
+        queue_timeout=float(os.environ.get("RHYTHM_QUEUE_TIMEOUT", 2.0)),
+    )
+    # bài chưa probe được ước lượng theo DEFAULT_DURATION: báo ngay nếu ngân sách không đủ cho max_concurrent job
+    fits = int(controller.memory_budget_mb // estimate_job_mb())
+    if fits < controller.max_concurrent:
+        print(f"! Ngân sách {controller.memory_budget_mb:.0f} MB/worker chỉ đủ {fits} job chưa probe cùng lúc "
+              f"(mỗi job ~{estimate_job_mb():.0f} MB), RHYTHM_MAX_CONCURRENT={controller.max_concurrent} "
+              f"không đạt được: tăng RAM / RHYTHM_MEMORY_TOTAL_MB hoặc giảm RHYTHM_WORKERS")
+    return controller
+
+
+def rate_limiter_from_env():
+    return RateLimiter(
+        rate_per_minute=float(os.environ.get("RHYTHM_RATE_PER_MINUTE", 6)),
+        burst=int(os.environ.get("RHYTHM_RATE_BURST", 3)),
+    )
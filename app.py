@@ -1,59 +1,302 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import os
-import yt_dlp
-from beatmap_generator import generate_from_input, sanitize_filename, LARAVEL_SONGS_PATH
+import json
+import math
+import inspect
+import threading
+from beatmap_generator import (generate_from_input, generate_batch, batch_pool_kind, sanitize_filename, save_preview,
+                               preview_path, effective_onset_engine, PREVIEW_COLORS, BATCH_CPU_WORKERS)
+from storage import get_storage
+from admission import controller_from_env, rate_limiter_from_env, estimate_job_mb, BASE_JOB_MB
+from probe import probe_remote, probe_file, choose_mode, too_long_message, MAX_DURATION
+from onset_engines import ENGINES
+from profiling import profile_format
+from catalog import get_catalog, SORT_KEYS
+from downloader import download_audio
 
 app = Flask(__name__)
 
+# Sau reverse proxy: số proxy tin cậy đứng trước app, để remote_addr là IP client thật (X-Forwarded-For)
+TRUSTED_PROXIES = int(os.environ.get("RHYTHM_TRUSTED_PROXIES", 0))
+if TRUSTED_PROXIES:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
+
+# Có thể thay bằng downloader / prober giả khi load test
+app.config.setdefault("DOWNLOADER", download_audio)
+app.config.setdefault("PROBER", probe_remote)
+
+# Mỗi worker process có ngân sách riêng
+admission = controller_from_env()
+rate_limiter = rate_limiter_from_env()
+# Catalog bài hát nạp một lần từ manifest lúc khởi động, sau đó cập nhật tăng dần
+get_catalog()
+
+
+def _client_id():
+    # Không dùng header do client tự đặt: đổi header mỗi request là có bucket mới
+    return request.remote_addr
+
+
+def _parse_duration(value):
+    """Độ dài bài (giây) client gửi kèm, chỉ dùng để ước lượng RAM; None nếu không gửi."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        duration = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("'duration' phải là số giây")
+    if not math.isfinite(duration) or duration < 0:
+        raise ValueError("'duration' phải là số giây không âm")
+    # ước lượng RAM không được nhỏ hơn một bài ngắn, cũng không vượt quá bài dài nhất được nhận
+    return min(max(duration, 1.0), MAX_DURATION)
+
+
+def _onset_engine_error(params):
+    onset_engine = params.get('onset_engine')
+    if not onset_engine:
+        return None
+    if onset_engine not in ENGINES:
+        return f"onset_engine không hợp lệ, chọn một trong: {', '.join(ENGINES)}"
+    if effective_onset_engine(onset_engine, params.get('multichannel'), params.get('hpss')) is None:
+        return "onset_engine không dùng được cùng 'multichannel' hoặc 'hpss' (hai chế độ này có envelope riêng)"
+    return None
+
+
+def _too_busy(message, retry_after):
+    resp = jsonify({"status": "error", "message": message})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify(admission.stats())
+
+
 @app.route('/generate', methods=['POST'])
 def generate():
+    name = request.json.get('name')
+    audio_link = request.json.get('audio')
+
+    if not audio_link or not name:
+        return jsonify({
+            "status": "error",
+            "message": "Thiếu tham số 'name' hoặc 'audio'!"
+        }), 400
+
+    onset_engine = request.json.get('onset_engine')
+    error = _onset_engine_error(request.json)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
+
+    # Profile theo yêu cầu: header X-Profile hoặc tham số "profile" (collapsed / speedscope)
     try:
-        name = request.json.get('name')
-        audio_link = request.json.get('audio')
-        input_type = request.json.get('input')
+        profile = profile_format(request.headers.get("X-Profile") or request.json.get('profile'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        client_duration = _parse_duration(request.json.get('duration'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    allowed, wait = rate_limiter.allow(_client_id())
+    if not allowed:
+        admission.record_rejection("rate_limited")
+        return _too_busy("Quá nhiều yêu cầu từ client này, thử lại sau!", wait)
+
+    # Probe metadata trước khi tải/decode để từ chối sớm và ước lượng RAM
+    info = app.config["PROBER"](audio_link)
+    mode = choose_mode(info)
+    if mode == "reject":
+        return _too_long(info)
+    duration = info["duration"] if info else client_duration
+
+    ticket, reason = admission.try_acquire(estimate_job_mb(duration, streaming=(mode == "streaming")))
+    if ticket is None:
+        return _too_busy(f"Server đang quá tải ({reason}), thử lại sau!", admission.retry_after())
+
+    try:
+        return _generate(name, audio_link, mode, probed=info is not None,
+                         multichannel=bool(request.json.get('multichannel')),
+                         hpss=bool(request.json.get('hpss')),
+                         onset_engine=onset_engine, profile=profile,
+                         full_previews=bool(request.json.get('full_previews')))
+    finally:
+        admission.release(ticket)
+
 
-        if not audio_link or not name:
-            return jsonify({
-                "status": "error",
-                "message": "Thiếu tham số 'name' hoặc 'audio'!"
-            }), 400
+MAX_PAGE = 100
 
+
+@app.route('/songs', methods=['GET'])
+def songs():
+    """Danh sách bài đã generate, lấy từ catalog trong RAM (không quét thư mục)."""
+    args = request.args
+    sort = args.get('sort', 'updated')
+    difficulty = args.get('difficulty')
+    if sort not in SORT_KEYS or (difficulty and difficulty not in PREVIEW_COLORS):
+        return jsonify({
+            "status": "error",
+            "message": f"sort chọn một trong: {', '.join(SORT_KEYS)}; difficulty: {', '.join(PREVIEW_COLORS)}"
+        }), 400
+
+    page = get_catalog().query(
+        q=args.get('q'), difficulty=difficulty,
+        min_stars=args.get('min_stars', type=float), max_stars=args.get('max_stars', type=float),
+        min_tempo=args.get('min_tempo', type=float), max_tempo=args.get('max_tempo', type=float),
+        sort=sort, offset=max(0, args.get('offset', 0, type=int)),
+        limit=min(MAX_PAGE, max(1, args.get('limit', 20, type=int))))
+    return jsonify({"status": "success", **page})
+
+
+@app.route('/songs/<safe_title>', methods=['GET'])
+def song(safe_title):
+    entry = get_catalog().get(safe_title)
+    if entry is None:
+        return jsonify({"status": "error", "message": "Không có bài này!"}), 404
+    return jsonify({"status": "success", "song": entry})
+
+
+@app.route('/preview/<safe_title>/<difficulty>', methods=['GET'])
+def preview(safe_title, difficulty):
+    """Preview đầy đủ 300 dpi: chỉ render khi có người mở, sau đó dùng lại file đã lưu."""
+    if difficulty not in PREVIEW_COLORS or safe_title != sanitize_filename(safe_title) or safe_title.startswith("."):
+        return jsonify({"status": "error", "message": "Không có preview này!"}), 404
+
+    storage = get_storage()
+    rel_path = preview_path(safe_title, difficulty)
+    if not storage.exists(rel_path):
+        beatmap_rel = f"{safe_title}/beatmaps/{safe_title}_{difficulty}.json"
+        if not storage.exists(beatmap_rel):
+            return jsonify({"status": "error", "message": "Không có beatmap này!"}), 404
+        save_preview(safe_title, difficulty, json.loads(storage.read_bytes(beatmap_rel)))
+    return Response(storage.read_bytes(rel_path), mimetype="image/png")
+
+
+MAX_BATCH = int(os.environ.get("RHYTHM_MAX_BATCH", 50))
+BATCH_IO_WORKERS = int(os.environ.get("RHYTHM_BATCH_IO_WORKERS", 4))
+_batch_pool_lock = threading.Lock()
+_batch_pool_reserved = False
+
+
+def _reserve_batch_pool():
+    """Pool process của batch sống suốt đời worker: trừ RAM nền của nó khỏi ngân sách một lần."""
+    global _batch_pool_reserved
+    with _batch_pool_lock:
+        if not _batch_pool_reserved and batch_pool_kind() == "process":
+            admission.reserve_fixed(BATCH_CPU_WORKERS * BASE_JOB_MB)
+            _batch_pool_reserved = True
+
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch_route():
+    items = request.json.get('items') or []
+    if not items or any(not it.get('name') or not it.get('audio') for it in items):
+        return jsonify({
+            "status": "error",
+            "message": "Cần danh sách 'items', mỗi item có 'name' và 'audio'!"
+        }), 400
+    if len(items) > MAX_BATCH:
+        return jsonify({"status": "error", "message": f"Tối đa {MAX_BATCH} bài mỗi batch!"}), 413
+    error = next(filter(None, map(_onset_engine_error, items)), None)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
+
+    # mỗi bài một token, như gửi từng bài qua /generate
+    allowed, wait = rate_limiter.allow(_client_id(), cost=len(items))
+    if not allowed:
+        admission.record_rejection("rate_limited")
+        return _too_busy("Quá nhiều yêu cầu từ client này, thử lại sau!", wait)
+
+    # Batch giữ tối đa in_flight bài đã decode cùng lúc (pool dùng chung có BATCH_CPU_WORKERS process)
+    _reserve_batch_pool()
+    job_mb = estimate_job_mb()
+    free_mb = admission.memory_budget_mb - admission.fixed_mb
+    in_flight = max(1, min(BATCH_CPU_WORKERS, len(items), int(free_mb // job_mb)))
+    ticket, reason = admission.try_acquire(job_mb * in_flight)
+    if ticket is None:
+        return _too_busy(f"Server đang quá tải ({reason}), thử lại sau!", admission.retry_after())
+
+    downloader, prober = app.config["DOWNLOADER"], app.config["PROBER"]
+
+    def download(item):
+        # Như /generate: probe trước khi tải để từ chối bài quá dài và chọn chế độ phân tích
+        info = prober(item["audio"])
+        mode = choose_mode(info)
+        if mode == "reject":
+            raise ValueError(too_long_message(info))
+        safe_title = sanitize_filename(item["name"])
+        output_dir = get_storage().local_path(safe_title)
+        os.makedirs(output_dir, exist_ok=True)
+        audio_path = downloader(item["audio"], output_dir, safe_title)
+        if info is None:
+            info = probe_file(audio_path)
+            mode = choose_mode(info)
+            if mode == "reject":
+                raise ValueError(too_long_message(info))
+        return audio_path, mode
+
+    # ticket chỉ được trả khi các bài đã gửi lên pool CPU chạy xong, kể cả khi client ngắt giữa chừng
+    batch = generate_batch(items, download=download, io_workers=BATCH_IO_WORKERS, max_in_flight=in_flight,
+                           on_idle=lambda: admission.release(ticket))
+
+    def stream():
+        # Mỗi dòng là một kết quả JSON (NDJSON), gửi ngay khi bài đó xong
+        for result in batch:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    resp = Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+    @resp.call_on_close
+    def _close():
+        # batch chưa chạy bước nào (client đi trước khi đọc) thì chưa giữ job nào: tự trả ticket
+        if inspect.getgeneratorstate(batch) == inspect.GEN_CREATED:
+            admission.release(ticket)
+        batch.close()
+
+    return resp
+
+
+def _too_long(info):
+    return jsonify({"status": "error", "message": too_long_message(info)}), 413
+
+
+def _generate(name, audio_link, mode="offline", probed=False, multichannel=False, hpss=False,
+              onset_engine=None, profile=None, full_previews=False):
+    try:
         safe_title = sanitize_filename(name)
 
-        output_dir = os.path.join(LARAVEL_SONGS_PATH, safe_title)
+        output_dir = get_storage().local_path(safe_title)
         os.makedirs(output_dir, exist_ok=True)
 
-        output_audio_base = os.path.join(output_dir, safe_title)
-        outtmpl = output_audio_base + ".%(ext)s"
-
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': outtmpl,
-            'quiet': True,
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-        }
-
-        print(f"🎵 Đang tải {audio_link} ...")
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([audio_link])
-
-        output_audio = os.path.join(output_dir, f"{safe_title}.mp3")
-
-        if not os.path.exists(output_audio):
-            downloaded_files = [f for f in os.listdir(output_dir) if f.lower().endswith(".mp3")]
-            if downloaded_files:
-                output_audio = os.path.join(output_dir, downloaded_files[0])
-            else:
-                raise FileNotFoundError("Không tìm thấy file mp3 sau khi tải!")
+        output_audio = app.config["DOWNLOADER"](audio_link, output_dir, safe_title)
 
         print(f"✅ Đã lưu MP3 tại: {output_audio}")
-        print("🚀 Bắt đầu sinh beatmap...")
 
-        result = generate_from_input(output_audio, song_title=name)
+        # Không có metadata từ nguồn: đọc header file trước khi decode
+        if not probed:
+            info = probe_file(output_audio)
+            mode = choose_mode(info)
+            if mode == "reject":
+                return _too_long(info)
+
+        print(f"🚀 Bắt đầu sinh beatmap ({mode})...")
+
+        result = generate_from_input(output_audio, song_title=name, mode=mode, multichannel=multichannel,
+                                     hpss=hpss, onset_engine=onset_engine, profile=profile,
+                                     full_previews=full_previews)
 
         print("🎯 Hoàn tất sinh beatmap!")
         return jsonify(result)
@@ -67,4 +310,5 @@ def generate():
 if __name__ == '__main__':
     print("- AI Beatmap Flask API (Natural Rhythm Version) -")
     print(f"Flask working dir: {os.getcwd()}")
-    app.run(debug=True)
\ No newline at end of file
+    # Chỉ dùng cho phát triển; production chạy qua gunicorn (xem gunicorn.conf.py)
+    app.run(debug=os.environ.get("FLASK_DEBUG", "1") == "1")
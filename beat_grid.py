@@ -0,0 +1,69 @@
+import numpy as np
+
+HOP_LENGTH = 512
+
+# Độ khó = số phần chia mỗi phách (1 = phách đen, 2 = móc đơn, 4 = móc kép)
+DIFFICULTY_SUBDIVISIONS = {"easy": 1, "normal": 2, "hard": 4}
+
+
+# ========== TEMPO MAP FROM EXISTING ONSET ENVELOPE ==========
+def track_beats(onset_env, sr, hop_length=HOP_LENGTH):
+    """Beat tracking trên onset envelope đã có (không phân tích lại tín hiệu): (tempo cả bài, thời điểm phách).
+
+    Tempo cục bộ chính là khoảng cách giữa các phách; subdivide_beats nội suy lưới trực tiếp trên đó.
+    """
+    import librosa
+
+    tempo, beat_frames = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
+    tempo = float(np.atleast_1d(tempo)[0])
+    return tempo, librosa.frames_to_time(beat_frames, sr=sr, hop_length=hop_length)
+
+
+# ========== SUBDIVISION GRID ==========
+def subdivide_beats(beat_times, subdivision, t_min=0.0, t_max=None):
+    """Lưới phần chia phách, nội suy giữa các phách và kéo dài ra hai đầu bài."""
+    beat_times = np.asarray(beat_times, dtype=float)
+    if len(beat_times) < 2:
+        return beat_times.copy()
+
+    intervals = np.diff(beat_times)
+    first, last = intervals[0], intervals[-1]
+    n_before = int(np.ceil(max(0.0, beat_times[0] - t_min) / first))
+    n_after = int(np.ceil(max(0.0, (t_max or beat_times[-1]) - beat_times[-1]) / last))
+    beats = np.concatenate([
+        beat_times[0] - first * np.arange(n_before, 0, -1),
+        beat_times,
+        beat_times[-1] + last * np.arange(1, n_after + 1),
+    ])
+
+    steps = np.diff(beats)[:, None] * (np.arange(subdivision) / subdivision)[None, :]
+    grid = np.append((beats[:-1, None] + steps).ravel(), beats[-1])
+    return grid[grid >= t_min - 1e-9]
+
+
+# ========== VECTORIZED SNAP ==========
+def quantize_onsets(onset_times, onset_strength, beat_times, subdivision, return_index=False):
+    """Đưa onset về điểm lưới gần nhất; mỗi điểm lưới giữ onset mạnh nhất.
+
+    return_index=True trả thêm chỉ số onset gốc được giữ (để mang theo thuộc tính khác như pan).
+    """
+    onset_times = np.asarray(onset_times, dtype=float)
+    # giữ float32 nếu strength đã là float32 (không nhân đôi bộ nhớ mỗi độ khó)
+    onset_strength = np.asarray(onset_strength, dtype=np.result_type(onset_strength, np.float32))
+    if len(onset_times) == 0 or len(beat_times) < 2:
+        if return_index:
+            return onset_times, onset_strength, np.arange(len(onset_times))
+        return onset_times, onset_strength
+
+    grid = subdivide_beats(beat_times, subdivision, t_max=onset_times.max())
+    idx = np.clip(np.searchsorted(grid, onset_times), 1, len(grid) - 1)
+    left, right = grid[idx - 1], grid[idx]
+    slots = np.where(onset_times - left <= right - onset_times, idx - 1, idx)
+
+    order = np.lexsort((-onset_strength, slots))
+    slots, strength = slots[order], onset_strength[order]
+    keep = np.ones(len(slots), dtype=bool)
+    keep[1:] = slots[1:] != slots[:-1]
+    if return_index:
+        return grid[slots[keep]], strength[keep], order[keep]
+    return grid[slots[keep]], strength[keep]
@@ -1,15 +1,31 @@
+import io
 import os
 import re
-import json
 import random
+import threading
 import numpy as np
-import librosa
-import librosa.display
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from storage import get_storage
+from beat_grid import track_beats, quantize_onsets, DIFFICULTY_SUBDIVISIONS
+from segmentation import compute_sections
+from note_index import validate_beatmap
+from multichannel import stereo_onset_envelopes, onset_pan, pick_lanes
+from hpss_stage import load_or_compute_hpss
+from onset_engines import get_engine
+from rating import rate_chart
+from decode import load_audio
+from catalog import get_catalog
+
+HOP_LENGTH = 512
+
+
+# librosa / matplotlib chỉ được import khi thật sự phân tích hoặc vẽ,
+# để server, CLI và worker khởi động nhanh.
+# Dùng Figure trực tiếp (không qua pyplot) để vẽ an toàn khi chạy nhiều thread.
+def _new_figure(figsize):
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    return fig, fig.add_subplot()
 
-LARAVEL_SONGS_PATH = "/Applications/XAMPP/xamppfiles/htdocs/rhythm_game_server/public/songs"
 
 # ========== CLEANING FILE NAME ==========
 def sanitize_filename(filename):
@@ -20,43 +36,124 @@ def sanitize_filename(filename):
 
 
 # ========== ANALYSING BEAT NATURALLY ==========
-def extract_beats(audio_path, energy_threshold=0.03):
+def effective_onset_engine(onset_engine, multichannel=False, hpss=False):
+    """Onset engine thật sự được dùng: multichannel (envelope L/R/M/S) và hpss (envelope bộ gõ) thay chỗ engine."""
+    return None if multichannel or hpss else onset_engine
+
+
+def analyze_audio(audio_path, energy_threshold=0.03, multichannel=False, hpss_cache=None, onset_engine=None):
+    import librosa
+
     print("🎵 Đang phân tích nhạc:", audio_path)
-    y, sr = librosa.load(audio_path, sr=None)
+    y, sr = load_audio(audio_path, mono=not multichannel)
+
+    channel_envs = None
+    if y.ndim == 2 and y.shape[0] >= 2:
+        # Decode một lần dạng (channels, samples); L/R/M/S tính chung một lượt STFT
+        channel_envs = stereo_onset_envelopes(y, sr)
+        y = librosa.to_mono(y)
+        onset_env = channel_envs[2]
+    else:
+        y = y.reshape(-1)
 
-    onset_frames = librosa.onset.onset_detect(y=y, sr=sr, backtrack=True)
-    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+    # HPSS (có cache): onset bộ gõ sinh tap, sustain của phần hòa âm sinh hold
+    stems = load_or_compute_hpss(y, sr, audio_path, hpss_cache) if hpss_cache else None
 
-    rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
-    rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr)
+    onset_frames = None
+    if channel_envs is None:
+        # Onset envelope tính một lần, dùng chung cho onset và beat tracking
+        if stems:
+            onset_env = stems["perc_env"]
+        else:
+            onset_frames, onset_env = get_engine(onset_engine).detect(y, sr)
+    if onset_frames is None:
+        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, backtrack=True)
 
-    valid_times, valid_strength = [], []
-    for t in onset_times:
-        idx = np.argmin(np.abs(rms_times - t))
-        e = float(rms[idx])
-        if e > energy_threshold:
-            valid_times.append(t)
-            valid_strength.append(e)
+    rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=HOP_LENGTH)[0]
+    rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=HOP_LENGTH)
 
-    valid_times = np.array(valid_times)
-    valid_strength = np.array(valid_strength)
-    if len(valid_strength) > 0:
-        valid_strength = (valid_strength - valid_strength.min()) / (valid_strength.max() - valid_strength.min() + 1e-9)
+    valid_times, valid_strength, valid_idx = filter_onsets(onset_frames, rms, sr, energy_threshold)
 
-    tempo = librosa.beat.tempo(y=y, sr=sr)
-    tempo = float(tempo[0]) if isinstance(tempo, (np.ndarray, list)) else float(tempo)
+    beat_pan = onset_pan(channel_envs, onset_frames[valid_idx]) if channel_envs is not None else None
+
+    tempo, grid_beats = track_beats(onset_env, sr)
+    sections = compute_sections(rms, onset_env, grid_beats, sr, len(y) / sr)
 
     print(f"Tempo ước lượng: {tempo:.2f} BPM - Onset hợp lệ: {len(valid_times)}")
-    return valid_times, valid_strength, tempo, y, sr, rms, rms_times
+    return {
+        "y": y,
+        "sr": sr,
+        "onset_env": onset_env,
+        "beat_times": valid_times,
+        "beat_strength": valid_strength,
+        "beat_pan": beat_pan,
+        "sustain": stems["sustain"] if stems else None,
+        "tempo": tempo,
+        "grid_beats": grid_beats,
+        "sections": sections,
+        "rms": rms,
+        "rms_times": rms_times,
+    }
+
+
+# ========== FRAME LOOKUPS (MASKS, NO PER-ONSET TEMPORARIES) ==========
+# Khung RMS / strength là float32 như librosa trả về; trục thời gian (onset, beat, rms_times) giữ float64
+# để bài dài vẫn chính xác tới ms và hòa giữa hai khung vẫn rơi về khung thấp hơn.
+def nearest_frames(times, hop_dur, n):
+    """Khung gần nhất cho mỗi thời điểm; hòa thì lấy khung thấp hơn, đúng như argmin(|rms_times - t|) trước đây."""
+    idx = np.ceil(np.asarray(times) / hop_dur - 0.5).astype(np.intp)
+    return np.clip(idx, 0, n - 1, out=idx)
+
+
+def filter_onsets(onset_frames, rms, sr, energy_threshold=0.03):
+    """Giữ onset có năng lượng RMS tại khung của nó vượt ngưỡng; trả về (times, strength chuẩn hóa 0..1, chỉ số giữ)."""
+    import librosa
+
+    energy = rms[np.minimum(onset_frames, len(rms) - 1)]
+    kept = np.flatnonzero(energy > energy_threshold)
+    times = librosa.frames_to_time(onset_frames[kept], sr=sr, hop_length=HOP_LENGTH)
+    strength = energy[kept].astype(np.float32, copy=False)
+    if len(strength) > 0:
+        strength -= strength.min()
+        strength /= strength.max() + np.float32(1e-9)
+    return times, strength, kept
+
+
+def rms_sustain(sample_times, rms, hop_dur, window_dur=0.5):
+    """mean(rms[idx:end]) / rms[idx] cho mọi thời điểm cùng lúc, trung bình cửa sổ lấy từ một lần cumsum."""
+    n = len(rms)
+    idx = nearest_frames(sample_times, hop_dur, n)
+    end = nearest_frames(np.asarray(sample_times) + window_dur, hop_dur, n)
+    csum = np.empty(n + 1, dtype=np.float64)
+    csum[0] = 0.0
+    np.cumsum(rms, out=csum[1:])
+    start = rms[idx]
+    out = start.astype(np.float32)
+    span = end > idx
+    out[span] = (csum[end[span]] - csum[idx[span]]) / (end[span] - idx[span])
+    out /= start + np.float32(1e-9)
+    return out
+
+
+def extract_beats(audio_path, energy_threshold=0.03, onset_engine=None):
+    a = analyze_audio(audio_path, energy_threshold, onset_engine=onset_engine)
+    return a["beat_times"], a["beat_strength"], a["tempo"], a["y"], a["sr"], a["rms"], a["rms_times"]
 
 
 # ========== GENERATING BEATMAP ==========
-def generate_beatmap_json(beat_times, beat_strength, rms, rms_times, safe_title, difficulty):
-    song_dir = os.path.join(LARAVEL_SONGS_PATH, safe_title)
-    beatmap_dir = os.path.join(song_dir, "beatmaps")
-    os.makedirs(beatmap_dir, exist_ok=True)
-    output_path = os.path.join(beatmap_dir, f"{safe_title}_{difficulty}.json")
+def generate_beatmap_json(beat_times, beat_strength, rms, rms_times, safe_title, difficulty, grid_beats=None,
+                          sections=None, beat_pan=None, sustain=None):
+    beatmap_data = build_beatmap(beat_times, beat_strength, rms, rms_times, difficulty, grid_beats=grid_beats,
+                                 sections=sections, beat_pan=beat_pan, sustain=sustain)
+    output_path = get_storage().write_json(f"{safe_title}/beatmaps/{safe_title}_{difficulty}.json", beatmap_data)
 
+    print(f"Đã lưu beatmap ({difficulty}) tại: {output_path}")
+    return output_path, beatmap_data
+
+
+def build_beatmap(beat_times, beat_strength, rms, rms_times, difficulty, grid_beats=None, sections=None,
+                  beat_pan=None, sustain=None):
+    """Sinh nốt (chưa ghi ra storage). Không có grid / sections / pan / sustain thì giống hệt bản v3."""
     beatmap_data = {"difficulty": difficulty, "beats": []}
 
     if difficulty == "easy":
@@ -66,41 +163,59 @@ def generate_beatmap_json(beat_times, beat_strength, rms, rms_times, safe_title,
     else:
         step, double_p, triple_p = 1, 0.25, 0.10
 
-    sample_times = beat_times[::step]
-    sample_strength = beat_strength[::step] if len(beat_strength) > 0 else np.zeros_like(sample_times)
+    if grid_beats is not None and len(grid_beats) > 1:
+        # Mật độ theo phần chia phách thay vì bỏ bớt onset
+        sample_times, sample_strength, kept = quantize_onsets(
+            beat_times, beat_strength, grid_beats, DIFFICULTY_SUBDIVISIONS[difficulty], return_index=True)
+        sample_pan = beat_pan[kept] if beat_pan is not None else None
+    else:
+        sample_times = beat_times[::step]
+        sample_strength = beat_strength[::step] if len(beat_strength) > 0 else np.zeros_like(sample_times)
+        sample_pan = beat_pan[::step] if beat_pan is not None else None
 
+    min_gap = 0.06
+    min_hold = 0.35
     if len(sample_times) == 0:
+        # chart rỗng vẫn cần validation + rating như mọi chart khác
         print("! Không có beat hợp lệ.")
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(beatmap_data, f, ensure_ascii=False, indent=4)
-        return output_path, beatmap_data
+        return finish_beatmap(beatmap_data, min_gap=min_gap, min_hold=min_hold)
 
-    min_gap = 0.06
-    min_hold = 0.35
     energy_hold_ratio = 0.6
 
+    window_dur = 0.5
+    hop_dur = float(rms_times[1] - rms_times[0]) if len(rms_times) > 1 else 1.0
+    if sustain is not None:
+        # sustain theo khung đã tính sẵn từ phần hòa âm (HPSS)
+        frames = np.clip(np.rint(sample_times / hop_dur).astype(int), 0, min(len(sustain), len(rms_times)) - 1)
+        sample_sustain = sustain[frames]
+    else:
+        sample_sustain = rms_sustain(sample_times, rms, hop_dur, window_dur)
+
+    # Mật độ theo đoạn nhạc, tra một lần cho cả mảng
+    density = sections.density_at(sample_times) if sections is not None else np.ones(len(sample_times))
+    skip_below = 0.05 + 0.25 * (1.0 - density)
+
     for i, (t, e) in enumerate(zip(sample_times, sample_strength)):
-        if e < 0.05:
+        if e < skip_below[i]:
             continue
 
         r = random.random()
-        if r < triple_p and e > 0.7:
+        if r < triple_p * density[i] and e > 0.7:
             count = 3
-        elif r < double_p + triple_p and e > 0.5:
+        elif r < (double_p + triple_p) * density[i] and e > 0.5:
             count = 2
         else:
             count = 1
 
-        lanes = random.sample([1, 2, 3, 4], count)
+        if sample_pan is not None:
+            lanes = pick_lanes(count, sample_pan[i])
+        else:
+            lanes = random.sample([1, 2, 3, 4], count)
         next_t = sample_times[i + 1] if i < len(sample_times) - 1 else None
 
-        for lane in lanes:
-            idx = np.argmin(np.abs(rms_times - t))
-            window_dur = 0.5
-            end_idx = np.argmin(np.abs(rms_times - (t + window_dur)))
-            energy_window = rms[idx:end_idx] if end_idx > idx else np.array([rms[idx]])
-            sustain_ratio = np.mean(energy_window) / (rms[idx] + 1e-9)
+        sustain_ratio = float(sample_sustain[i])
 
+        for lane in lanes:
             want_hold = (sustain_ratio > energy_hold_ratio)
 
             if want_hold:
@@ -128,104 +243,408 @@ def generate_beatmap_json(beat_times, beat_strength, rms, rms_times, safe_title,
 
             beatmap_data["beats"].append(note)
 
-    beatmap_data["beats"].sort(key=lambda n: (n["time"], n["lane"]))
+    return finish_beatmap(beatmap_data, min_gap=min_gap, min_hold=min_hold)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(beatmap_data, f, ensure_ascii=False, indent=4)
 
-    print(f"Đã lưu beatmap ({difficulty}) tại: {output_path}")
-    return output_path, beatmap_data
+def finish_beatmap(beatmap_data, min_gap=0.06, min_hold=0.35):
+    """Sắp xếp, kiểm tra + sửa và chấm điểm chart theo lane (dùng chung cho mọi strategy và streaming)."""
+    beatmap_data["beats"].sort(key=lambda n: (n["time"], n["lane"]))
+
+    beatmap_data, report = validate_beatmap(beatmap_data, min_gap=min_gap, min_hold=min_hold)
+    beatmap_data["validation"] = report
+    beatmap_data["rating"] = rate_chart(beatmap_data["beats"])
+    print(f"Kiểm tra beatmap ({beatmap_data['difficulty']}): {report} - {beatmap_data['rating']['stars']}★")
+    return beatmap_data
 
 
 # ========== GENERATING PREVIEW ==========
-def save_preview(safe_title, difficulty, beatmap_data):
-    song_dir = os.path.join(LARAVEL_SONGS_PATH, safe_title)
-    os.makedirs(song_dir, exist_ok=True)
-    output_path = os.path.join(song_dir, f"{safe_title}_{difficulty}_preview.png")
-
-    plt.figure(figsize=(8, 6))
-    plt.title(f"Preview Beatmap - {safe_title} ({difficulty})")
-
-    color = {"easy": "limegreen", "normal": "orange", "hard": "crimson"}[difficulty]
-
-    for note in beatmap_data["beats"]:
-        lane, t = note["lane"], note["time"]
-        if note["type"] == "hold":
-            dur = note.get("duration", 0.0)
-            plt.plot([lane, lane], [t, t + dur], color=color, linewidth=4, alpha=0.8)
-            plt.scatter(lane, t, s=20, color='black')
-        else:
-            plt.scatter(lane, t, s=20, color=color, alpha=0.8)
-
-    for lx in [1, 2, 3, 4]:
-        plt.axvline(x=lx, color='lightgray', linestyle='--', linewidth=1)
-        plt.text(lx, -0.3, f"Lane {lx}", ha='center', fontsize=9, color='gray')
-
-    plt.xlabel("Lane (1–4)")
-    plt.ylabel("Thời gian (s)")
-    plt.gca().invert_yaxis()
-    plt.xlim(0.5, 4.5)
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300)
-    plt.close()
+PREVIEW_COLORS = {"easy": "limegreen", "normal": "orange", "hard": "crimson"}
+SHEET_DPI = 100          # sprite sheet 3 ô, mỗi ô 300×600 px
+THUMB_WIDTH = 120        # thumbnail mỗi độ khó, cắt từ sprite sheet
+
+
+def _draw_chart(ax, difficulty, beatmap_data, sections=None, labels=True):
+    """Vẽ một chart lên ax: mỗi loại nốt là một artist (không vẽ từng nốt riêng lẻ)."""
+    color = PREVIEW_COLORS[difficulty]
+    beats = beatmap_data["beats"]
+    taps = [(n["lane"], n["time"]) for n in beats if n["type"] != "hold"]
+    holds = [(n["lane"], n["time"], n["time"] + n.get("duration", 0.0)) for n in beats if n["type"] == "hold"]
+
+    if holds:
+        lanes, t0, t1 = zip(*holds)
+        ax.vlines(lanes, t0, t1, color=color, linewidth=4, alpha=0.8)
+        ax.scatter(lanes, t0, s=20, color='black')
+    if taps:
+        lanes, t = zip(*taps)
+        ax.scatter(lanes, t, s=20, color=color, alpha=0.8)
+
+    if sections is not None:
+        for k, (s0, s1, label) in enumerate(zip(sections.starts, sections.ends, sections.labels)):
+            ax.axhspan(s0, s1, color='whitesmoke' if k % 2 else 'white', zorder=0)
+            if labels:
+                ax.text(4.45, s0, label, ha='right', va='top', fontsize=7, color='gray')
+
+    ax.vlines([1, 2, 3, 4], 0, 1, transform=ax.get_xaxis_transform(), color='lightgray', linestyle='--',
+              linewidth=1, zorder=1)
+    if labels:
+        for lx in [1, 2, 3, 4]:
+            ax.text(lx, -0.3, f"Lane {lx}", ha='center', fontsize=9, color='gray')
+    ax.invert_yaxis()
+    ax.set_xlim(0.5, 4.5)
+
+
+def preview_path(safe_title, difficulty):
+    return f"{safe_title}/{safe_title}_{difficulty}_preview.png"
+
+
+def save_preview(safe_title, difficulty, beatmap_data, sections=None, rel_path=None):
+    """Preview đầy đủ 2400×1800 px; chỉ vẽ khi được yêu cầu (xem app.py /preview)."""
+    rel_path = rel_path or preview_path(safe_title, difficulty)
+
+    fig, ax = _new_figure(figsize=(8, 6))
+    ax.set_title(f"Preview Beatmap - {safe_title} ({difficulty})")
+    _draw_chart(ax, difficulty, beatmap_data, sections)
+    ax.set_xlabel("Lane (1–4)")
+    ax.set_ylabel("Thời gian (s)")
+    fig.tight_layout()
+    output_path = get_storage().save_figure(rel_path, fig, dpi=300)
     print(f"Đã lưu preview tại: {output_path}")
     return output_path
 
 
+def save_preview_sheet(safe_title, beatmaps, sections=None, rel_dir=None):
+    """Một figure cho cả 3 độ khó: sprite sheet PNG + thumbnail (WebP nếu có) cắt từ cùng một lần render.
+
+    Trả về {"sheet": rel_path, "thumbnails": {difficulty: rel_path}}.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PIL import Image, features
+
+    rel_dir = rel_dir or safe_title
+    difficulties = [d for d in PREVIEW_COLORS if d in beatmaps]
+    fig = Figure(figsize=(3 * len(difficulties), 6), dpi=SHEET_DPI)
+    canvas = FigureCanvasAgg(fig)
+    axes = fig.subplots(1, len(difficulties), squeeze=False)[0]
+    # mỗi độ khó chiếm đúng một cột bằng nhau để cắt thumbnail theo pixel
+    fig.subplots_adjust(left=0, right=1, bottom=0, top=0.95, wspace=0)
+    t_max = max((n["time"] + n.get("duration", 0.0) for d in difficulties for n in beatmaps[d]["beats"]),
+                default=1.0)
+    for ax, diff in zip(axes, difficulties):
+        _draw_chart(ax, diff, beatmaps[diff], sections, labels=False)
+        ax.set_ylim(t_max + 0.5, -0.5)
+        ax.set_title(diff, fontsize=10)
+        ax.set_xticks([])
+        ax.tick_params(axis="y", labelsize=7, pad=-22)
+    canvas.draw()
+    sheet = Image.fromarray(np.asarray(canvas.buffer_rgba())).convert("RGB")
+
+    storage = get_storage()
+    buf = io.BytesIO()
+    sheet.save(buf, format="PNG", optimize=True)
+    sheet_path = f"{rel_dir}/{safe_title}_previews.png"
+    storage.write_bytes(sheet_path, buf.getvalue())
+
+    fmt, ext = ("WEBP", "webp") if features.check("webp") else ("PNG", "png")
+    tile_w = sheet.width // len(difficulties)
+    thumbnails = {}
+    for k, diff in enumerate(difficulties):
+        tile = sheet.crop((k * tile_w, 0, (k + 1) * tile_w, sheet.height))
+        tile = tile.resize((THUMB_WIDTH, round(sheet.height * THUMB_WIDTH / tile_w)), Image.LANCZOS)
+        buf = io.BytesIO()
+        tile.save(buf, format=fmt, quality=80)
+        thumbnails[diff] = f"{rel_dir}/{safe_title}_{diff}_thumb.{ext}"
+        storage.write_bytes(thumbnails[diff], buf.getvalue())
+
+    print(f"Đã lưu sprite sheet + {len(thumbnails)} thumbnail tại: {sheet_path}")
+    return {"sheet": sheet_path, "thumbnails": thumbnails}
+
+
 # ========== GENERATING WAVEFORM ==========
-def save_waveform_plot(y, sr, beat_times, tempo, safe_title):
-    song_dir = os.path.join(LARAVEL_SONGS_PATH, safe_title)
-    os.makedirs(song_dir, exist_ok=True)
-    out_path = os.path.join(song_dir, f"{safe_title}_waveform.png")
+def save_waveform_plot(y, sr, beat_times, tempo, safe_title, rel_path=None):
+    rel_path = rel_path or f"{safe_title}/{safe_title}_waveform.png"
 
-    plt.figure(figsize=(12, 4))
+    fig, ax = _new_figure(figsize=(12, 4))
     times = np.arange(len(y)) / sr
-    plt.plot(times, y, color='gray', alpha=0.5)
+    ax.plot(times, y, color='gray', alpha=0.5)
     if len(beat_times) > 0:
-        plt.vlines(beat_times, ymin=-1, ymax=1, color='dodgerblue', alpha=0.6, linewidth=1.2)
-    plt.title(f"{safe_title} — Waveform + Onsets ({tempo:.1f} BPM)")
-    plt.xlabel("Thời gian (s)")
-    plt.ylabel("Biên độ")
-    plt.tight_layout()
-    plt.savefig(out_path, dpi=300)
-    plt.close()
+        ax.vlines(beat_times, ymin=-1, ymax=1, color='dodgerblue', alpha=0.6, linewidth=1.2)
+    ax.set_title(f"{safe_title} — Waveform + Onsets ({tempo:.1f} BPM)")
+    ax.set_xlabel("Thời gian (s)")
+    ax.set_ylabel("Biên độ")
+    fig.tight_layout()
+    out_path = get_storage().save_figure(rel_path, fig, dpi=300)
     print(f"Đã lưu waveform tại: {out_path}")
     return out_path
 
 
-# ========== MAIN GENERATOR ==========
-def generate_from_input(audio_path, song_title=None):
-    print("- AI Auto Beatmap Generator v6 (Clean Path Version) -")
+# ========== STREAMING GENERATOR (LONG INPUTS) ==========
+def generate_streaming(audio_path, song_title, safe_title, full_previews=False):
+    """Bài quá dài: phân tích theo block, không giữ toàn bộ tín hiệu trong RAM, không vẽ waveform."""
+    from realtime_analyzer import analyze_file_stream
 
-    song_title = song_title or os.path.splitext(os.path.basename(audio_path))[0]
-    safe_title = sanitize_filename(song_title)
+    storage = get_storage()
+    beatmaps = {}
+    results, features = analyze_file_stream(audio_path, with_features=True)
+    for diff, (data, stats) in results.items():
+        data = finish_beatmap(data)
+        storage.write_json(f"{safe_title}/beatmaps/{safe_title}_{diff}.json", data)
+        print(f"Đã lưu beatmap ({diff}, streaming) - độ trễ mỗi block: {stats}")
+        beatmaps[diff] = data
+        if full_previews:
+            save_preview(safe_title, diff, data)
+        else:
+            # chart vừa sinh lại: preview cũ (nếu có) không còn đúng, /preview sẽ vẽ lại khi được mở
+            storage.delete(preview_path(safe_title, diff))
+    previews = save_preview_sheet(safe_title, beatmaps)
+    storage.flush()
 
-    song_dir = os.path.join(LARAVEL_SONGS_PATH, safe_title)
-    os.makedirs(song_dir, exist_ok=True)
+    # beat tracking trên onset envelope của cả bài (đã tính khi stream, không decode lại)
+    tempo, _ = track_beats(np.asarray(features.env, dtype=np.float32), features.sr)
 
-    mp3_target = os.path.join(song_dir, f"{safe_title}.mp3")
-    if os.path.exists(audio_path) and audio_path != mp3_target:
-        os.rename(audio_path, mp3_target)
-        audio_path = mp3_target
+    return {
+        "status": "success",
+        "title": song_title,
+        "tempo": tempo,
+        "analysis_mode": "streaming",
+        "audio_path": f"/songs/{safe_title}/{safe_title}.mp3",
+        "waveform_path": None,
+        "sections": [],
+        "preview_sheet": f"/songs/{previews['sheet']}",
+        "thumbnails": {d: f"/songs/{p}" for d, p in previews["thumbnails"].items()},
+        "beatmaps": beatmaps
+    }
 
-    beat_times, beat_strength, tempo, y, sr, rms, rms_times = extract_beats(audio_path)
 
-    beatmaps = {}
-    for diff in ["easy", "normal", "hard"]:
-        path, data = generate_beatmap_json(beat_times, beat_strength, rms, rms_times, safe_title, diff)
-        beatmaps[diff] = data
-        save_preview(safe_title, diff, data)
+# ========== MAIN GENERATOR ==========
+def generate_from_input(audio_path, song_title=None, mode="offline", multichannel=False, hpss=False,
+                        onset_engine=None, profile=None, full_previews=False):
+    """profile: None (tắt, không tốn gì thêm), "collapsed" hoặc "speedscope" để lưu flamegraph."""
+    print("- AI Auto Beatmap Generator v6 (Clean Path Version) -")
 
-    save_waveform_plot(y, sr, beat_times, tempo, safe_title)
+    song_title = song_title or os.path.splitext(os.path.basename(audio_path))[0]
+    safe_title = sanitize_filename(song_title)
+
+    storage = get_storage()
+    if profile:
+        from profiling import run_profiled
+
+        result, rel_path = run_profiled(
+            lambda: generate_from_input(audio_path, song_title, mode, multichannel, hpss, onset_engine,
+                                        full_previews=full_previews),
+            storage, f"{safe_title}/profiles", safe_title, fmt=profile)
+        result["profile_path"] = f"/songs/{rel_path}"
+        return result
+
+    audio_path = storage.import_file(audio_path, f"{safe_title}/{safe_title}.mp3")
+
+    if mode == "streaming":
+        result = generate_streaming(audio_path, song_title, safe_title, full_previews=full_previews)
+        get_catalog().record(result, safe_title)
+        print(f"Hoàn tất generate cho {song_title}")
+        return result
+
+    # Cùng engine với strategies.py: phân tích + chart được cache theo nội dung file và tùy chọn
+    from strategies import BeatmapEngine, GridStrategy
+
+    engine = BeatmapEngine(audio_path, safe_title, multichannel=multichannel, hpss=hpss, onset_engine=onset_engine)
+    beatmaps = engine.run([GridStrategy.name])[GridStrategy.name]
+    previews = engine.previews[GridStrategy.name]
+    analysis = engine.analysis()
+    tempo = analysis["tempo"]
+    for diff, data in beatmaps.items():
+        if full_previews:
+            save_preview(safe_title, diff, data, sections=analysis["sections"])
+        else:
+            # preview cũ có thể vẽ từ chart trước đó (tùy chọn khác): xóa, /preview sẽ vẽ lại khi được mở
+            storage.delete(preview_path(safe_title, diff))
+    storage.flush()
 
     result = {
         "status": "success",
         "title": song_title,
         "tempo": float(tempo),
+        "analysis_mode": "offline",
         "audio_path": f"/songs/{safe_title}/{safe_title}.mp3",
         "waveform_path": f"/songs/{safe_title}/{safe_title}_waveform.png",
+        "sections": analysis["sections"].to_list(),
+        "preview_sheet": f"/songs/{previews['sheet']}",
+        "thumbnails": {d: f"/songs/{p}" for d, p in previews["thumbnails"].items()},
         "beatmaps": beatmaps
     }
+    get_catalog().record(result, safe_title)
 
     print(f"Hoàn tất generate cho {song_title}")
-    return result
\ No newline at end of file
+    return result
+
+# ========== BATCH GENERATOR ==========
+# Một pool mỗi loại, kích thước cố định, sống suốt đời process (process pool: tính vào ngân sách RAM của app)
+BATCH_CPU_WORKERS = int(os.environ.get("RHYTHM_BATCH_CPU_WORKERS", 2))
+_cpu_pools = {}
+_cpu_pools_lock = threading.Lock()
+
+
+def _warm_worker():
+    # Import + chạy thử một lần để JIT numba và cache bộ lọc mel trước khi nhận việc
+    import librosa
+
+    y = np.random.default_rng(0).standard_normal(22050).astype(np.float32) * 0.1
+    librosa.onset.onset_detect(y=y, sr=22050, backtrack=True)
+
+
+def batch_pool_kind():
+    # MemoryStorage chỉ sống trong process hiện tại nên phải phân tích bằng thread
+    from storage import MemoryStorage
+
+    return "thread" if isinstance(get_storage(), MemoryStorage) else "process"
+
+
+def _get_cpu_pool(kind):
+    """Pool dùng lại giữa các batch để giữ module đã import, cache và numba JIT."""
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    with _cpu_pools_lock:
+        if kind not in _cpu_pools:
+            if kind == "process":
+                import multiprocessing
+
+                # không fork từ worker gunicorn đang chạy nhiều thread (lock bị chép giữa chừng → kẹt)
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                _cpu_pools[kind] = ProcessPoolExecutor(max_workers=BATCH_CPU_WORKERS, initializer=_warm_worker,
+                                                       mp_context=multiprocessing.get_context(method))
+            else:
+                _cpu_pools[kind] = ThreadPoolExecutor(max_workers=BATCH_CPU_WORKERS, initializer=_warm_worker)
+        return _cpu_pools[kind]
+
+
+def _drop_cpu_pool(kind, pool):
+    """Pool hỏng (process con bị kill, ví dụ OOM): bỏ khỏi cache để batch sau tạo pool mới."""
+    with _cpu_pools_lock:
+        if _cpu_pools.get(kind) is pool:
+            del _cpu_pools[kind]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _batch_item(audio_path, name, options, storage=None):
+    try:
+        # process mới (forkserver / spawn) chỉ biết storage từ env: dùng đúng storage của process gọi
+        if storage is not None and get_storage() is not storage:
+            from storage import set_storage
+
+            set_storage(storage)
+        return generate_from_input(audio_path, song_title=name, **options)
+    except Exception as e:
+        return {"status": "error", "title": name, "message": str(e)}
+
+
+def generate_batch(items, download=None, io_workers=4, max_in_flight=None, on_idle=None):
+    """Sinh beatmap cho nhiều bài; trả về generator, mỗi kết quả được yield ngay khi xong.
+
+    items: list dict {"name", "audio", tùy chọn "mode"/"multichannel"/"hpss"/"onset_engine"}.
+    download(item) -> đường dẫn file audio, hoặc (đường dẫn, mode) nếu đã probe bài; chạy trên pool I/O,
+    raise để báo lỗi riêng item đó. Bỏ trống nếu "audio" đã là file.
+    max_in_flight: số bài của batch này được phân tích cùng lúc trên pool dùng chung (mặc định cả pool).
+    on_idle(): gọi một lần khi batch không còn job CPU nào chạy, kể cả khi generator bị đóng giữa chừng
+    (client ngắt kết nối): việc chưa bắt đầu bị hủy, việc đang chạy trên pool chạy nốt rồi mới gọi.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    storage = get_storage()
+    kind = batch_pool_kind()
+    cpu_pool = _get_cpu_pool(kind)
+    max_in_flight = max(1, max_in_flight or BATCH_CPU_WORKERS)
+    option_keys = ("mode", "multichannel", "hpss", "onset_engine", "full_previews")
+    ready = []        # (index, audio_path, options) chờ slot CPU
+    in_flight = 0
+    pending = {}
+    io_pool = ThreadPoolExecutor(max_workers=io_workers)
+
+    try:
+        for i, item in enumerate(items):
+            if download:
+                pending[io_pool.submit(download, item)] = (i, True)
+            else:
+                ready.append((i, item["audio"], {k: item[k] for k in option_keys if k in item}))
+
+        while pending or ready:
+            while ready and in_flight < max_in_flight:
+                i, audio_path, options = ready.pop(0)
+                args = (_batch_item, audio_path, items[i]["name"], options, storage)
+                try:
+                    fut = cpu_pool.submit(*args)
+                except BrokenProcessPool:
+                    _drop_cpu_pool(kind, cpu_pool)
+                    cpu_pool = _get_cpu_pool(kind)
+                    fut = cpu_pool.submit(*args)
+                pending[fut] = (i, False)
+                in_flight += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, is_download = pending.pop(fut)
+                item = items[i]
+                if is_download:
+                    try:
+                        audio_path = fut.result()
+                    except Exception as e:
+                        yield {"index": i, "status": "error", "title": item["name"], "message": str(e)}
+                        continue
+                    options = {k: item[k] for k in option_keys if k in item}
+                    if isinstance(audio_path, tuple):
+                        audio_path, options["mode"] = audio_path
+                    ready.append((i, audio_path, options))
+                else:
+                    in_flight -= 1
+                    try:
+                        result = fut.result()
+                    except BrokenProcessPool as e:
+                        # mọi bài đang chạy trên pool này đều hỏng theo; bài sau chạy trên pool mới
+                        _drop_cpu_pool(kind, cpu_pool)
+                        result = {"status": "error", "title": item["name"],
+                                  "message": f"Process phân tích bị dừng đột ngột: {e}"}
+                    except Exception as e:
+                        result = {"status": "error", "title": item["name"], "message": str(e)}
+                    yield {"index": i, **result}
+    finally:
+        # hủy việc chưa bắt đầu; không chờ các lượt tải đang chạy
+        running = [fut for fut, (_, is_download) in pending.items() if not fut.cancel() and not is_download]
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        if on_idle is not None:
+            _call_when_done(running, on_idle)
+
+
+def _call_when_done(futures, callback):
+    """Gọi callback một lần khi mọi future đã xong (ngay lập tức nếu danh sách rỗng)."""
+    if not futures:
+        callback()
+        return
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for fut in futures:
+        fut.add_done_callback(_done)
+
+if __name__ == "__main__":
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print("Cách dùng: python beatmap_generator.py <file nhạc> [tên bài] [--profile[=collapsed|speedscope]]")
+        sys.exit(1)
+    profile = None
+    for a in sys.argv[1:]:
+        if a.startswith("--profile"):
+            from profiling import profile_format
+
+            profile = profile_format(a.partition("=")[2] or "1")
+    result = generate_from_input(args[0], args[1] if len(args) > 1 else None, profile=profile)
+    if result.get("profile_path"):
+        print(f"Profile: {result['profile_path']}")
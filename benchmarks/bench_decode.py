@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from decode import load_audio, choose_backends, FFMPEG
+from bench_startup import write_click_track
+
+SR = 44100
+TARGET_SR = 22050
+
+
+# ========== FIXTURES (ONE SONG, MANY CONTAINERS) ==========
+def make_fixtures(tmp, seconds=60):
+    import soundfile as sf
+
+    wav = os.path.join(tmp, "click.wav")
+    write_click_track(wav, sr=SR, seconds=seconds)
+    y, sr = sf.read(wav, dtype="float32")
+    paths = {"wav": wav}
+    for ext, fmt in (("flac", "FLAC"), ("ogg", "OGG"), ("mp3", "MP3")):
+        if fmt in sf.available_formats():
+            paths[ext] = os.path.join(tmp, f"click.{ext}")
+            # ghi theo block: encoder vorbis của libsndfile crash khi ghi một buffer lớn một lần
+            with sf.SoundFile(paths[ext], "w", sr, 1, format=fmt) as f:
+                for i in range(0, len(y), 1 << 16):
+                    f.write(y[i:i + (1 << 16)])
+    if FFMPEG:
+        for ext in ("m4a", "webm"):
+            out = os.path.join(tmp, f"click.{ext}")
+            if subprocess.run([FFMPEG, "-nostdin", "-v", "error", "-y", "-i", wav, out]).returncode == 0:
+                paths[ext] = out
+    return paths
+
+
+def time_load(fn, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        y, _ = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, y
+
+
+def main(repeats=3):
+    import librosa
+
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = make_fixtures(tmp)
+        librosa.load(paths["wav"], sr=None)  # warm-up: import lazy + cache bộ lọc resample
+        print(f"{'format':<8}{'backend':<12}{'native ms':>11}{f'→{TARGET_SR} ms':>14}{'samples':>11}")
+        for ext, path in paths.items():
+            candidates = [(name, lambda sr, name=name: load_audio(path, sr=sr, backend=name))
+                          for name in choose_backends(path) if name != "audioread"]
+            candidates.append(("librosa", lambda sr: librosa.load(path, sr=sr)))
+            for name, fn in candidates:
+                try:
+                    native, y = time_load(lambda: fn(None), repeats)
+                    resampled, _ = time_load(lambda: fn(TARGET_SR), repeats)
+                except Exception as e:
+                    print(f"{ext:<8}{name:<12}  lỗi: {e}")
+                    continue
+                print(f"{ext:<8}{name:<12}{native * 1000:>11.1f}{resampled * 1000:>14.1f}{len(y):>11}")
+        print(f"\nload_audio chọn: " + ", ".join(f"{ext}={choose_backends(p)[0]}" for ext, p in paths.items()))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import resource
+import tracemalloc
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_startup import write_click_track
+
+HOP_LENGTH = 512
+
+
+# ========== HOT LOOPS BEFORE THE FLOAT32 / MASK REWORK (REFERENCE) ==========
+def legacy_filter_onsets(onset_frames, rms, sr, energy_threshold=0.03):
+    import librosa
+
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+    rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr)
+    valid_times, valid_strength = [], []
+    for t in onset_times:
+        idx = np.argmin(np.abs(rms_times - t))
+        e = float(rms[idx])
+        if e > energy_threshold:
+            valid_times.append(t)
+            valid_strength.append(e)
+    valid_times = np.array(valid_times)
+    valid_strength = np.array(valid_strength)
+    if len(valid_strength) > 0:
+        valid_strength = (valid_strength - valid_strength.min()) / (valid_strength.max() - valid_strength.min() + 1e-9)
+    return valid_times, valid_strength
+
+
+def legacy_sustain(sample_times, rms, sr, window_dur=0.5):
+    import librosa
+
+    rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr)
+    out = []
+    for t in sample_times:
+        idx = np.argmin(np.abs(rms_times - t))
+        end_idx = np.argmin(np.abs(rms_times - (t + window_dur)))
+        energy_window = rms[idx:end_idx] if end_idx > idx else np.array([rms[idx]])
+        out.append(np.mean(energy_window) / (rms[idx] + 1e-9))
+    return np.array(out)
+
+
+def current_filter_onsets(onset_frames, rms, sr, energy_threshold=0.03):
+    from beatmap_generator import filter_onsets
+
+    times, strength, _ = filter_onsets(onset_frames, rms, sr, energy_threshold)
+    return times, strength
+
+
+def current_sustain(sample_times, rms, sr, window_dur=0.5):
+    from beatmap_generator import rms_sustain
+
+    return rms_sustain(sample_times, rms, HOP_LENGTH / sr, window_dur)
+
+
+VARIANTS = {
+    "before": (legacy_filter_onsets, legacy_sustain),
+    "after": (current_filter_onsets, current_sustain),
+}
+
+
+# ========== ONE MEASUREMENT PER PROCESS (PEAK RSS IS PER PROCESS) ==========
+def measure(variant, fixture):
+    """Chạy bước lọc onset + sustain trên dữ liệu đã phân tích sẵn; in JSON số đo."""
+    import librosa  # import trước để RSS nền không tính vào phép đo
+
+    data = np.load(fixture)
+    onset_frames, rms, sr = data["onset_frames"], data["rms"], int(data["sr"])
+    filter_fn, sustain_fn = VARIANTS[variant]
+    filter_fn(onset_frames[:10], rms, sr)  # warm-up import / cache
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    times, strength = filter_fn(onset_frames, rms, sr)
+    sustain = sustain_fn(times, rms, sr)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        "seconds": elapsed,
+        "traced_peak_mb": peak / 2 ** 20,
+        "onsets": len(times),
+        "dtype": str(np.asarray(strength).dtype),
+        "checksum": [float(np.sum(times)), float(np.sum(strength)), float(np.sum(sustain))],
+    }))
+
+
+def _patch_legacy(beatmap_generator):
+    """Thay filter_onsets / rms_sustain của pipeline bằng bản cũ (cùng chữ ký với bản hiện tại)."""
+    def filter_onsets(onset_frames, rms, sr, energy_threshold=0.03):
+        times, strength = legacy_filter_onsets(onset_frames, rms, sr, energy_threshold)
+        return times, strength, None  # chỉ số giữ chỉ dùng cho pan (multichannel), đo ở chế độ mono
+
+    def rms_sustain(sample_times, rms, hop_dur, window_dur=0.5):
+        return legacy_sustain(sample_times, rms, HOP_LENGTH / hop_dur, window_dur)
+
+    beatmap_generator.filter_onsets = filter_onsets
+    beatmap_generator.rms_sustain = rms_sustain
+
+
+def _peak_rss_mb():
+    """Đỉnh RSS của process này. ru_maxrss trên Linux giữ qua exec (tính cả đỉnh của process cha đã load bài),
+    nên ưu tiên VmHWM, được đặt lại khi exec."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_pipeline(variant, audio_path):
+    """Peak RSS của cả analyze_audio + 3 độ khó với bước lọc onset / sustain cũ hoặc mới, trong process riêng."""
+    import beatmap_generator
+    from storage import set_storage, MemoryStorage
+
+    if variant == "before":
+        _patch_legacy(beatmap_generator)
+    set_storage(MemoryStorage())
+    base_rss = _peak_rss_mb()
+    t0 = time.perf_counter()
+    a = beatmap_generator.analyze_audio(audio_path)
+    for diff in ("easy", "normal", "hard"):
+        beatmap_generator.build_beatmap(a["beat_times"], a["beat_strength"], a["rms"], a["rms_times"], diff,
+                                        grid_beats=a["grid_beats"], sections=a["sections"])
+    print(json.dumps({"seconds": time.perf_counter() - t0,
+                      "peak_rss_mb": _peak_rss_mb(),
+                      "rss_growth_mb": _peak_rss_mb() - base_rss,
+                      "dtypes": {k: str(np.asarray(a[k]).dtype) for k in ("y", "onset_env", "rms", "beat_strength")}}))
+
+
+def run(*args):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), *args], cwd=ROOT, capture_output=True,
+                         text=True, check=True, env=dict(os.environ, RHYTHM_STORAGE="memory"))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(seconds=600):
+    import librosa
+
+    tmp = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmp, "click.wav")
+        write_click_track(src, seconds=seconds, bpm=480)
+        y, sr = librosa.load(src, sr=None)
+        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
+        fixture = os.path.join(tmp, "fixture.npz")
+        np.savez(fixture, onset_frames=librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, backtrack=True),
+                 rms=librosa.feature.rms(y=y, frame_length=2048, hop_length=HOP_LENGTH)[0], sr=sr)
+        del y
+
+        print(f"Bài tổng hợp {seconds}s. Bước lọc onset + sustain:")
+        print(f"{'':<8}{'ms':>9}{'traced peak MB':>16}{'onsets':>8}  dtype")
+        results = {}
+        for variant in VARIANTS:
+            r = results[variant] = run("--measure", variant, fixture)
+            print(f"{variant:<8}{r['seconds'] * 1000:>9.1f}{r['traced_peak_mb']:>16.2f}{r['onsets']:>8}  {r['dtype']}")
+        b, a = results["before"]["checksum"], results["after"]["checksum"]
+        print(f"checksum (times, strength, sustain): before {np.round(b, 3).tolist()} / after {np.round(a, 3).tolist()}")
+
+        print("\nCả pipeline (analyze_audio + 3 độ khó), mỗi lần một process:")
+        print(f"{'':<8}{'s':>8}{'peak RSS MB':>13}{'RSS +MB':>9}  dtype")
+        for variant in VARIANTS:
+            p = run("--pipeline", variant, src)
+            print(f"{variant:<8}{p['seconds']:>8.2f}{p['peak_rss_mb']:>13.0f}{p['rss_growth_mb']:>9.0f}  {p['dtypes']}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--pipeline":
+        measure_pipeline(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 600)
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import beatmap_generator
+print(time.perf_counter() - t0)
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import sys, time, json
+t0 = time.perf_counter()
+import beatmap_generator
+t1 = time.perf_counter()
+beatmap_generator.generate_from_input(sys.argv[1], song_title="bench")
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first_request": t2 - t1}))
+"""
+
+
+# ========== SYNTHETIC SONG ==========
+def write_click_track(path, sr=22050, seconds=10, bpm=120):
+    import soundfile as sf
+
+    y = 0.02 * np.random.default_rng(0).standard_normal(sr * seconds)
+    click = np.exp(-np.arange(int(0.05 * sr)) / (0.01 * sr)) * 0.8
+    for t in np.arange(0.5, seconds - 0.5, 60.0 / bpm):
+        i = int(t * sr)
+        y[i:i + len(click)] += click
+    sf.write(path, y.astype(np.float32), sr)
+
+
+def run(snippet, *args):
+    env = dict(os.environ, RHYTHM_STORAGE="memory", PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", snippet, *args], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def main(repeats=5):
+    import_times = [float(run(IMPORT_SNIPPET)) for _ in range(repeats)]
+    print(f"import beatmap_generator: median {statistics.median(import_times) * 1000:.1f} ms "
+          f"(min {min(import_times) * 1000:.1f} ms, {repeats} runs)")
+
+    tmp = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmp, "click.wav")
+        write_click_track(src)
+        first = []
+        for _ in range(repeats):
+            first.append(json.loads(run(FIRST_REQUEST_SNIPPET, src))["first_request"])
+        print(f"first request (cold process): median {statistics.median(first) * 1000:.1f} ms "
+              f"(min {min(first) * 1000:.1f} ms)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
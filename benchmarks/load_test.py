@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import write_click_track
+
+
+# ========== FAKE DOWNLOADER ==========
+def make_fake_downloader(src_path):
+    def fake_download(audio_link, output_dir, safe_title):
+        target = os.path.join(output_dir, f"{safe_title}.mp3")
+        shutil.copyfile(src_path, target)
+        return target
+    return fake_download
+
+
+def start_local_server(src_path, concurrency, requests, seconds):
+    os.environ.setdefault("RHYTHM_STORAGE", "memory")
+    # mọi request đến từ cùng một IP: nới rate limit của server nội bộ
+    os.environ.setdefault("RHYTHM_RATE_BURST", "1000000")
+    # đo pipeline chứ không đo lượt từ chối: đủ slot + hàng đợi cho mọi request, ước lượng RAM theo bài giả
+    os.environ.setdefault("RHYTHM_MAX_CONCURRENT", str(concurrency))
+    os.environ.setdefault("RHYTHM_MAX_QUEUE", str(requests))
+    os.environ.setdefault("RHYTHM_QUEUE_TIMEOUT", "600")
+    os.environ.setdefault("RHYTHM_DEFAULT_DURATION", str(seconds))
+    from werkzeug.serving import make_server
+    from app import app
+
+    app.config["DOWNLOADER"] = make_fake_downloader(src_path)
+    app.config["PROBER"] = lambda audio_link: None
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ========== LOAD ==========
+def post_generate(url, i):
+    body = json.dumps({"name": f"load test {i}", "audio": "fake://song"}).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    req = urllib.request.Request(url + "/generate", data=body, headers=headers)
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            status = resp.status
+            resp.read()
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /generate")
+    parser.add_argument("--url", help="server đang chạy (vd. gunicorn); bỏ trống để chạy server nội bộ với downloader giả")
+    parser.add_argument("-n", "--requests", type=int, default=20)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--seconds", type=int, default=10, help="độ dài bài nhạc giả")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    server = None
+    try:
+        url = args.url
+        if not url:
+            src = os.path.join(tmp, "click.wav")
+            write_click_track(src, seconds=args.seconds)
+            server, url = start_local_server(src, args.concurrency, args.requests, args.seconds)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(lambda i: post_generate(url, i), range(args.requests)))
+        wall = time.perf_counter() - t0
+
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f"Requests: {args.requests} (concurrency {args.concurrency}) - status: {statuses}")
+        # 429 trả về gần như tức thì: tính riêng để không kéo throughput / độ trễ của bài sinh xong
+        ok = np.array([lat for status, lat in results if status == 200])
+        rejected = np.array([lat for status, lat in results if status != 200])
+        print(f"Throughput (200): {len(ok) / wall:.2f} req/s")
+        if len(ok):
+            print(f"Latency (200): p50 {np.percentile(ok, 50):.2f}s  p95 {np.percentile(ok, 95):.2f}s  "
+                  f"max {ok.max():.2f}s")
+        if len(rejected):
+            print(f"Rejected: {len(rejected)} - latency p50 {np.percentile(rejected, 50):.3f}s  "
+                  f"max {rejected.max():.3f}s")
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
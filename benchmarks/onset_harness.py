@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from onset_engines import ENGINES, get_engine
+
+HOP_LENGTH = 512
+TOLERANCE = 0.05
+
+
+# ========== SYNTHETIC FIXTURES (KNOWN ONSETS) ==========
+def _hit(sr, freq, decay, length=0.2, noise=0.0, rng=None):
+    n = int(length * sr)
+    t = np.arange(n) / sr
+    tone = np.sin(2 * np.pi * freq * t) if freq else 0.0
+    burst = noise * rng.standard_normal(n) if noise else 0.0
+    return (tone + burst) * np.exp(-t / decay)
+
+
+def make_fixtures(sr=22050, seconds=20, seed=0):
+    rng = np.random.default_rng(seed)
+    fixtures = {}
+
+    # 1. click track đều 120 BPM
+    onsets = np.arange(0.5, seconds - 0.5, 0.5)
+    fixtures["clicks_120bpm"] = (onsets, sr)
+
+    # 2. tiếng đàn (hòa âm) với nhịp ngẫu nhiên, nền nhiễu
+    gaps = rng.uniform(0.15, 0.6, size=200)
+    onsets = np.cumsum(gaps) + 0.3
+    fixtures["tonal_random"] = (onsets[onsets < seconds - 0.5], sr)
+
+    # 3. trống + bass kéo dài + vibrato (khó cho flux đơn giản)
+    onsets = np.arange(0.4, seconds - 0.5, 60.0 / 150 / 2)
+    fixtures["drums_vibrato_150bpm"] = (onsets, sr)
+
+    signals = {}
+    for name, (onsets, sr) in fixtures.items():
+        y = np.zeros(int(seconds * sr))
+        if name == "drums_vibrato_150bpm":
+            t = np.arange(len(y)) / sr
+            y += 0.2 * np.sin(2 * np.pi * 220 * t + 3.0 * np.sin(2 * np.pi * 5 * t))
+        y += 0.01 * rng.standard_normal(len(y))
+        for k, o in enumerate(onsets):
+            if name == "clicks_120bpm":
+                h = _hit(sr, 0, 0.005, noise=1.0, rng=rng)
+            elif name == "tonal_random":
+                h = 0.6 * _hit(sr, rng.choice([262, 330, 392, 523]), 0.08)
+            else:
+                h = _hit(sr, 60 if k % 2 == 0 else 0, 0.03, noise=0.0 if k % 2 == 0 else 0.8, rng=rng)
+            i = int(o * sr)
+            y[i:i + len(h)] += h[:len(y) - i]
+        signals[name] = (y.astype(np.float32), sr, onsets)
+    return signals
+
+
+# ========== F-MEASURE ==========
+def f_measure(reference, estimated, tolerance=TOLERANCE):
+    """Ghép 1-1 tham lam trong cửa sổ ±tolerance (giống mir_eval.onset)."""
+    if len(reference) == 0 or len(estimated) == 0:
+        return 0.0, 0.0, 0.0
+    used = np.zeros(len(estimated), dtype=bool)
+    hits = 0
+    for r in reference:
+        idx = np.flatnonzero(~used & (np.abs(estimated - r) <= tolerance))
+        if len(idx):
+            used[idx[np.argmin(np.abs(estimated[idx] - r))]] = True
+            hits += 1
+    precision = hits / len(estimated)
+    recall = hits / len(reference)
+    f = 2 * precision * recall / (precision + recall) if hits else 0.0
+    return f, precision, recall
+
+
+def main(repeats=3):
+    """Chấm trên khung đỉnh (chất lượng phát hiện); F của onset đã backtrack (thứ pipeline dùng) in kèm để so."""
+    signals = make_fixtures()
+    print(f"{'engine':<15}{'fixture':<24}{'F':>6}{'P':>6}{'R':>6}{'F(bt)':>7}{'ms':>9}")
+    summary = {}
+    for name in ENGINES:
+        engine = get_engine(name)
+        engine.detect(*signals["clicks_120bpm"][:2])  # warm-up (numba JIT, filter caches)
+        scores, bt_scores, runtimes = [], [], []
+        for fixture, (y, sr, onsets) in signals.items():
+            best = np.inf
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                frames, _ = engine.detect(y, sr)
+                best = min(best, time.perf_counter() - t0)
+            peaks, _ = engine.detect(y, sr, backtrack=False)
+            f, p, r = f_measure(onsets, peaks * HOP_LENGTH / sr)
+            f_bt = f_measure(onsets, frames * HOP_LENGTH / sr)[0]
+            scores.append(f)
+            bt_scores.append(f_bt)
+            runtimes.append(best)
+            print(f"{name:<15}{fixture:<24}{f:>6.2f}{p:>6.2f}{r:>6.2f}{f_bt:>7.2f}{best * 1000:>9.1f}")
+        summary[name] = (np.mean(scores), np.mean(bt_scores), np.sum(runtimes))
+
+    print("\nTổng kết (F trung bình trên khung đỉnh / F sau backtrack / tổng thời gian):")
+    for name, (f, f_bt, rt) in sorted(summary.items(), key=lambda kv: -kv[1][0]):
+        print(f"  {name:<15} F={f:.3f}  F(bt)={f_bt:.3f}  {rt * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import threading
+from storage import get_storage, LocalStorage
+
+MANIFEST = "catalog.jsonl"
+DIFFICULTIES = ("easy", "normal", "hard")
+SORT_KEYS = {
+    "updated": (lambda s: s["updated_at"], True),
+    "title": (lambda s: s["title"].lower(), False),
+    "tempo": (lambda s: s["tempo"], False),
+}
+
+
+def _entry_from_result(result, safe_title):
+    """Tóm tắt một kết quả generate: độ khó, tempo, số nốt, đường dẫn và hash nội dung từng beatmap."""
+    difficulties = {}
+    for diff, data in result.get("beatmaps", {}).items():
+        # cùng bytes với storage.write_json nên hash khớp file đã lưu
+        raw = json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+        beats = data.get("beats", [])
+        difficulties[diff] = {
+            "notes": len(beats),
+            "holds": sum(1 for n in beats if n.get("type") == "hold"),
+            "stars": data.get("rating", {}).get("stars"),
+            "path": f"/songs/{safe_title}/beatmaps/{safe_title}_{diff}.json",
+            "sha1": hashlib.sha1(raw).hexdigest(),
+        }
+    return {
+        "safe_title": safe_title,
+        "title": result.get("title") or safe_title,
+        "tempo": round(float(result.get("tempo") or 0.0), 2),
+        "analysis_mode": result.get("analysis_mode", "offline"),
+        "audio_path": result.get("audio_path"),
+        "waveform_path": result.get("waveform_path"),
+        "preview_sheet": result.get("preview_sheet"),
+        "thumbnails": result.get("thumbnails", {}),
+        "difficulties": difficulties,
+        "updated_at": round(time.time(), 3),
+    }
+
+
+# ========== IN-MEMORY INDEX OVER AN APPEND-ONLY MANIFEST ==========
+class Catalog:
+    """Chỉ mục bài hát trong RAM, nạp từ manifest JSON lines (mỗi dòng một entry, dòng sau ghi đè dòng trước).
+
+    Mỗi lần generate chỉ nối thêm một dòng. Worker khác ghi thêm thì refresh() đọc phần mới dựa trên kích thước
+    file, không quét thư mục songs.
+    """
+
+    def __init__(self, storage, manifest=MANIFEST):
+        self.storage = storage
+        self.manifest = manifest
+        self.songs = {}
+        self._offset = 0
+        self._sorted = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    # ---------- manifest ----------
+    def refresh(self):
+        with self._lock:
+            size = self.storage.size(self.manifest) if self.storage.exists(self.manifest) else 0
+            if size == self._offset:
+                return False
+            if size < self._offset:
+                # manifest bị ghi lại (compact ở worker khác): nạp lại từ đầu
+                self.songs, self._offset = {}, 0
+            chunk = self.storage.read_from(self.manifest, self._offset)[:size - self._offset]
+            # chỉ nhận các dòng đã ghi trọn vẹn
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    self.songs[entry["safe_title"]] = entry
+            self._offset += len(complete)
+            self._sorted.clear()
+            return True
+
+    def compact(self):
+        """Ghi lại manifest chỉ với bản mới nhất của mỗi bài (chạy tay, khi không có worker nào đang ghi)."""
+        with self._lock:
+            data = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n"
+                           for e in self.songs.values())
+            self.storage.write_text(self.manifest, data)
+            self._offset = len(data.encode("utf-8"))
+
+    def record(self, result, safe_title):
+        """Cập nhật tăng dần sau mỗi lần generate: một entry trong RAM + một dòng nối vào manifest."""
+        entry = _entry_from_result(result, safe_title)
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            # một lần ghi nối một dòng; worker khác có thể nối xen kẽ nên không tự dời _offset,
+            # lần refresh sau đọc lại cả dòng này (ghi đè cùng entry, vô hại)
+            self.storage.append_bytes(self.manifest, line)
+            self.songs[safe_title] = entry
+            self._sorted.clear()
+        return entry
+
+    # ---------- queries ----------
+    def get(self, safe_title):
+        self.refresh()
+        return self.songs.get(safe_title)
+
+    def query(self, q=None, difficulty=None, min_stars=None, max_stars=None, min_tempo=None, max_tempo=None,
+              sort="updated", offset=0, limit=20):
+        """Lọc + phân trang trên bản đã sắp xếp sẵn (chỉ sắp lại khi catalog thay đổi)."""
+        self.refresh()
+        key, reverse = SORT_KEYS[sort]
+        with self._lock:
+            if sort not in self._sorted:
+                self._sorted[sort] = sorted(self.songs.values(), key=key, reverse=reverse)
+            songs = self._sorted[sort]
+
+        q = q.lower() if q else None
+
+        def match(s):
+            if q and q not in s["title"].lower() and q not in s["safe_title"].lower():
+                return False
+            if min_tempo is not None and s["tempo"] < min_tempo:
+                return False
+            if max_tempo is not None and s["tempo"] > max_tempo:
+                return False
+            if difficulty is None and min_stars is None and max_stars is None:
+                return True
+            for diff in ([difficulty] if difficulty else s["difficulties"]):
+                d = s["difficulties"].get(diff)
+                if d is None:
+                    continue
+                stars = d.get("stars") or 0.0
+                if (min_stars is None or stars >= min_stars) and (max_stars is None or stars <= max_stars):
+                    return True
+            return False
+
+        matched = [s for s in songs if match(s)]
+        return {"total": len(matched), "offset": offset, "limit": limit, "songs": matched[offset:offset + limit]}
+
+    # ---------- one-off migration ----------
+    def rebuild_from_songs(self):
+        """Dựng lại catalog từ các thư mục songs/<title>/beatmaps có sẵn (chạy tay một lần, không dùng khi phục vụ)."""
+        root = self.storage.local_path()
+        for beatmap_dir in sorted(glob.glob(os.path.join(root, "*", "beatmaps"))):
+            safe_title = os.path.basename(os.path.dirname(beatmap_dir))
+            beatmaps = {}
+            for diff in DIFFICULTIES:
+                path = os.path.join(beatmap_dir, f"{safe_title}_{diff}.json")
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        beatmaps[diff] = json.load(f)
+            if not beatmaps:
+                continue
+            sheet = f"{safe_title}/{safe_title}_previews.png"
+            self.record({
+                "title": safe_title,
+                "tempo": 0.0,
+                "audio_path": f"/songs/{safe_title}/{safe_title}.mp3",
+                "waveform_path": f"/songs/{safe_title}/{safe_title}_waveform.png",
+                "preview_sheet": f"/songs/{sheet}" if self.storage.exists(sheet) else None,
+                "beatmaps": beatmaps,
+            }, safe_title)
+        self.compact()
+        return len(self.songs)
+
+
+# ========== SHARED INSTANCE (FOLLOWS THE CURRENT STORAGE) ==========
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    storage = get_storage()
+    with _catalog_lock:
+        if _catalog is None or _catalog.storage is not storage:
+            _catalog = Catalog(storage)
+        return _catalog
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("--rebuild", "--compact"):
+        print("Cách dùng: python catalog.py --rebuild | --compact   (manifest catalog.jsonl trong LARAVEL_SONGS_PATH)")
+        sys.exit(1)
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        print("Chỉ dùng được với storage trên đĩa (LARAVEL_SONGS_PATH).")
+        sys.exit(1)
+    catalog = get_catalog()
+    if sys.argv[1] == "--rebuild":
+        catalog.rebuild_from_songs()
+    else:
+        catalog.compact()
+    print(f"Đã ghi {len(catalog.songs)} bài vào {storage.local_path(MANIFEST)}")
@@ -0,0 +1,315 @@
+import os
+import json
+import shutil
+import subprocess
+from functools import lru_cache
+import numpy as np
+
+# Đuôi file → định dạng libsndfile (libsndfile >= 1.1 đọc được cả MP3)
+SOUNDFILE_EXTS = {".wav": "WAV", ".flac": "FLAC", ".ogg": "OGG", ".oga": "OGG", ".aiff": "AIFF", ".aif": "AIFF",
+                  ".mp3": "MP3"}
+FFMPEG_EXTS = {".mp3", ".m4a", ".mp4", ".aac", ".webm", ".opus", ".wma"}
+FFMPEG = os.environ.get("RHYTHM_FFMPEG") or shutil.which("ffmpeg")
+FFPROBE = os.environ.get("RHYTHM_FFPROBE") or shutil.which("ffprobe")
+BLOCK_FRAMES = 1 << 16
+BACKENDS = ("soundfile", "ffmpeg", "audioread")
+
+
+# ========== BACKEND SELECTION ==========
+@lru_cache(maxsize=1)
+def _soundfile_exts():
+    try:
+        import soundfile as sf
+    except ImportError:
+        return frozenset()
+    formats = sf.available_formats()
+    return frozenset(ext for ext, fmt in SOUNDFILE_EXTS.items() if fmt in formats)
+
+
+def choose_backends(audio_path):
+    """Thứ tự backend nên thử cho file này, nhanh nhất trước; audioread (librosa.load) luôn ở cuối."""
+    ext = os.path.splitext(audio_path)[1].lower()
+    order = []
+    if ext in _soundfile_exts():
+        order.append("soundfile")
+    if FFMPEG and ext in FFMPEG_EXTS:
+        order.append("ffmpeg")
+    order.append("audioread")
+    return order
+
+
+def load_audio(audio_path, sr=None, mono=True, backend=None):
+    """Thay cho librosa.load: trả về (y float32, sr); y là (channels, samples) khi mono=False và file có nhiều kênh.
+
+    sr=None giữ sample rate gốc; nếu đặt sr thì resample ngay trong lượt decode.
+    """
+    last_error = None
+    for name in ([backend] if backend else choose_backends(audio_path)):
+        try:
+            return _LOADERS[name](audio_path, sr, mono)
+        except Exception as e:
+            if backend:
+                raise
+            print(f"! Backend {name} không decode được {os.path.basename(audio_path)}: {e}")
+            last_error = e
+    raise last_error
+
+
+def _shape(buf, frames, mono):
+    """(frames, channels) → 1-D khi mono / một kênh, ngược lại (channels, frames) như librosa."""
+    y = buf[:frames]
+    if y.shape[1] == 1:
+        return y.reshape(-1)
+    if mono:
+        return y.mean(axis=1)
+    return np.ascontiguousarray(y.T)
+
+
+# ========== SOUNDFILE (+ STREAMING SOXR) ==========
+def _load_soundfile(audio_path, sr, mono):
+    import soundfile as sf
+
+    with sf.SoundFile(audio_path) as f:
+        native_sr, channels = f.samplerate, f.channels
+        out_channels = 1 if mono else channels
+        # libsndfile 1.2 đọc MP3 theo nhiều block bị lệch frame → MP3 luôn đọc một lần rồi mới resample
+        if not sr or sr == native_sr or f.format == "MP3":
+            if f.frames <= 0:
+                raise ValueError("không rõ số mẫu")
+            buf = np.empty((f.frames, channels), dtype=np.float32)
+            y = _shape(buf, len(f.read(out=buf)), mono)
+            if not sr or sr == native_sr:
+                return y, native_sr
+            import soxr
+
+            return soxr.resample(y.T, native_sr, sr, quality="HQ").T.astype(np.float32, copy=False), sr
+
+        # Resample từng block bằng soxr (cùng chất lượng soxr_hq mặc định của librosa) vào buffer cấp phát sẵn
+        import soxr
+
+        stream = soxr.ResampleStream(native_sr, sr, out_channels, dtype="float32", quality="HQ")
+        out = np.empty((int(np.ceil(max(f.frames, 0) * sr / native_sr)) + BLOCK_FRAMES, out_channels),
+                       dtype=np.float32)
+        block = np.empty((BLOCK_FRAMES, channels), dtype=np.float32)
+        n = 0
+        while True:
+            got = f.read(out=block)
+            last = len(got) < BLOCK_FRAMES
+            chunk = got.mean(axis=1, keepdims=True) if mono and channels > 1 else got
+            res = stream.resample_chunk(chunk, last=last)
+            if n + len(res) > len(out):
+                out = np.concatenate([out, np.empty((len(res) + BLOCK_FRAMES, out_channels), dtype=np.float32)])
+            out[n:n + len(res)] = res
+            n += len(res)
+            if last:
+                break
+    return _shape(out, n, mono), sr
+
+
+# ========== FFMPEG PIPE (RAW PCM → PREALLOCATED BUFFER) ==========
+def _ffprobe(audio_path):
+    out = subprocess.run([FFPROBE, "-v", "error", "-select_streams", "a:0",
+                          "-show_entries", "stream=sample_rate,channels:format=duration", "-of", "json", audio_path],
+                         capture_output=True, text=True, check=True)
+    info = json.loads(out.stdout)
+    stream = info["streams"][0]
+    return int(stream["sample_rate"]), int(stream["channels"]), float(info.get("format", {}).get("duration") or 0)
+
+
+def _load_ffmpeg(audio_path, sr, mono):
+    if not FFMPEG or not FFPROBE:
+        raise RuntimeError("không tìm thấy ffmpeg / ffprobe")
+    native_sr, channels, duration = _ffprobe(audio_path)
+    out_sr = sr or native_sr
+    out_channels = 1 if mono else channels
+
+    # ffmpeg decode + downmix + resample trong một process, xuất float32 thô ra stdout
+    cmd = [FFMPEG, "-nostdin", "-v", "error", "-i", audio_path, "-map", "0:a:0",
+           "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(out_channels), "-ar", str(out_sr), "pipe:1"]
+    frame_bytes = 4 * out_channels
+    buf = np.empty((int(np.ceil(duration * out_sr)) + out_sr, out_channels), dtype=np.float32)
+    n_bytes = 0
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0) as proc:
+        while True:
+            view = memoryview(buf).cast("B")
+            if n_bytes == len(view):
+                buf = np.concatenate([buf, np.empty((out_sr * 10, out_channels), dtype=np.float32)])
+                continue
+            got = proc.stdout.readinto(view[n_bytes:])
+            if not got:
+                break
+            n_bytes += got
+        err = proc.stderr.read()
+        if proc.wait() != 0:
+            raise RuntimeError(err.decode(errors="replace").strip() or f"ffmpeg lỗi {proc.returncode}")
+    return _shape(buf, n_bytes // frame_bytes, mono), out_sr
+
+
+# ========== FALLBACK ==========
+def _load_audioread(audio_path, sr, mono):
+    import librosa
+
+    y, native_sr = librosa.load(audio_path, sr=sr, mono=mono)
+    return y, native_sr
+
+
+_LOADERS = {"soundfile": _load_soundfile, "ffmpeg": _load_ffmpeg, "audioread": _load_audioread}
+
+
+# ========== STREAMING (BLOCK BY BLOCK, SAMPLE RATE GỐC) ==========
+def choose_stream_backends(audio_path):
+    """Như choose_backends, nhưng MP3 ưu tiên ffmpeg: soundfile phải decode MP3 cả bài một lần."""
+    order = choose_backends(audio_path)
+    if os.path.splitext(audio_path)[1].lower() == ".mp3" and "ffmpeg" in order:
+        order.remove("ffmpeg")
+        order.insert(0, "ffmpeg")
+    return order
+
+
+def open_stream(audio_path, block_frames=BLOCK_FRAMES, mono=True, backend=None):
+    """Đọc file theo block: trả về (sr, iterator block float32); block là (n,) khi mono, ngược lại (n, channels).
+
+    Backend được chọn lúc mở (lỗi thì thử backend sau). Block có thể dùng chung buffer giữa các lần yield,
+    cần giữ lại thì chép ra.
+    """
+    last_error = None
+    for name in ([backend] if backend else choose_stream_backends(audio_path)):
+        try:
+            return _STREAMERS[name](audio_path, block_frames, mono)
+        except Exception as e:
+            if backend:
+                raise
+            print(f"! Backend {name} không mở được {os.path.basename(audio_path)}: {e}")
+            last_error = e
+    raise last_error
+
+
+def _downmix(block, mono):
+    if not mono:
+        return block
+    return block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+
+
+def _stream_soundfile(audio_path, block_frames, mono):
+    import soundfile as sf
+
+    f = sf.SoundFile(audio_path)
+    if f.format == "MP3":
+        # libsndfile 1.2 đọc MP3 theo block bị lệch frame: decode một lần rồi chia block
+        f.close()
+        y, sr = _load_soundfile(audio_path, None, mono)
+        y = y if y.ndim == 1 else y.T
+        return sr, (y[i:i + block_frames] for i in range(0, len(y), block_frames))
+
+    def blocks():
+        with f:
+            buf = np.empty((block_frames, f.channels), dtype=np.float32)
+            while True:
+                got = f.read(out=buf)
+                if len(got):
+                    yield _downmix(got, mono)
+                if len(got) < block_frames:
+                    break
+
+    return f.samplerate, blocks()
+
+
+def _stream_ffmpeg(audio_path, block_frames, mono):
+    if not FFMPEG or not FFPROBE:
+        raise RuntimeError("không tìm thấy ffmpeg / ffprobe")
+    native_sr, channels, _ = _ffprobe(audio_path)
+    out_channels = 1 if mono else channels
+    cmd = [FFMPEG, "-nostdin", "-v", "error", "-i", audio_path, "-map", "0:a:0",
+           "-f", "f32le", "-acodec", "pcm_f32le", "-ac", str(out_channels), "pipe:1"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+    def blocks():
+        buf = np.empty((block_frames, out_channels), dtype=np.float32)
+        view = memoryview(buf).cast("B")
+        try:
+            while True:
+                # pipe trả về từng mẩu: đọc tới khi đầy block hoặc hết dữ liệu
+                n_bytes = 0
+                while n_bytes < len(view):
+                    got = proc.stdout.readinto(view[n_bytes:])
+                    if not got:
+                        break
+                    n_bytes += got
+                frames = n_bytes // (4 * out_channels)
+                if frames:
+                    yield _downmix(buf[:frames], mono)
+                if n_bytes < len(view):
+                    break
+            err = proc.stderr.read()
+            if proc.wait() != 0:
+                raise RuntimeError(err.decode(errors="replace").strip() or f"ffmpeg lỗi {proc.returncode}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+
+    return native_sr, blocks()
+
+
+def _stream_audioread(audio_path, block_frames, mono):
+    import audioread
+
+    f = audioread.audio_open(audio_path)
+    sr, channels = f.samplerate, f.channels
+
+    def blocks():
+        with f:
+            for raw in f:
+                # audioread trả PCM int16 xen kẽ các kênh, kích thước buffer tùy backend
+                block = np.frombuffer(raw, dtype="<i2").reshape(-1, channels) * np.float32(1.0 / 32768.0)
+                yield _downmix(block, mono)
+
+    return sr, blocks()
+
+
+_STREAMERS = {"soundfile": _stream_soundfile, "ffmpeg": _stream_ffmpeg, "audioread": _stream_audioread}
+
+
+# ========== PROBE (HEADER ONLY, NO DECODE) ==========
+def probe_audio(audio_path):
+    """Đọc duration / sample rate / số kênh từ header, cùng thứ tự backend với load_audio; None nếu không đọc được."""
+    ext = os.path.splitext(audio_path)[1].lower()
+    order = [name for name, ok in (("soundfile", ext in _soundfile_exts()),
+                                   ("ffmpeg", FFPROBE and ext in FFMPEG_EXTS),
+                                   ("audioread", True)) if ok]
+    last_error = None
+    for name in order:
+        try:
+            info = _PROBERS[name](audio_path)
+        except Exception as e:
+            last_error = e
+            continue
+        if info["duration"] > 0:
+            return info
+    print(f"! Không probe được {audio_path}: {last_error!r}")
+    return None
+
+
+def _probe_soundfile(audio_path):
+    import soundfile as sf
+
+    info = sf.info(audio_path)
+    return {"duration": info.frames / info.samplerate, "sr": info.samplerate, "channels": info.channels,
+            "source": "soundfile"}
+
+
+def _probe_ffmpeg(audio_path):
+    sr, channels, duration = _ffprobe(audio_path)
+    return {"duration": duration, "sr": sr, "channels": channels, "source": "ffprobe"}
+
+
+def _probe_audioread(audio_path):
+    import audioread
+
+    with audioread.audio_open(audio_path) as f:
+        return {"duration": float(f.duration), "sr": f.samplerate, "channels": f.channels, "source": "audioread"}
+
+
+_PROBERS = {"soundfile": _probe_soundfile, "ffmpeg": _probe_ffmpeg, "audioread": _probe_audioread}
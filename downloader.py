@@ -0,0 +1,40 @@
+import os
+from beatmap_generator import sanitize_filename
+
+
+# ========== DOWNLOADER (yt-dlp → MP3) ==========
+def download_audio(audio_link, output_dir, safe_title=None):
+    """Tải audio bằng yt-dlp và chuyển sang MP3, trả về đường dẫn file.
+
+    safe_title=None: đặt tên file theo tiêu đề của nguồn (đã sanitize), như các script auto_beatmap cũ.
+    """
+    import yt_dlp
+
+    os.makedirs(output_dir, exist_ok=True)
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'outtmpl': os.path.join(output_dir, f"{safe_title or '%(title)s'}.%(ext)s"),
+        'quiet': True,
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }],
+    }
+
+    print(f"🎵 Đang tải {audio_link} ...")
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(audio_link, download=True)
+        downloaded = os.path.splitext(ydl.prepare_filename(info))[0] + ".mp3"
+
+    output_audio = os.path.join(output_dir, f"{safe_title or sanitize_filename(info['title'])}.mp3")
+    if os.path.exists(downloaded) and os.path.abspath(downloaded) != os.path.abspath(output_audio):
+        os.replace(downloaded, output_audio)
+
+    if not os.path.exists(output_audio):
+        downloaded_files = [f for f in os.listdir(output_dir) if f.lower().endswith(".mp3")]
+        if downloaded_files:
+            output_audio = os.path.join(output_dir, downloaded_files[0])
+        else:
+            raise FileNotFoundError("Không tìm thấy file mp3 sau khi tải!")
+    return output_audio
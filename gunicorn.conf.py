@@ -0,0 +1,24 @@
+# Production server: gunicorn -c gunicorn.conf.py app:app
+import os
+import multiprocessing
+
+bind = os.environ.get("RHYTHM_BIND", "0.0.0.0:5000")
+
+# Mỗi job giữ cả bài nhạc đã decode trong RAM nên mặc định ít worker
+workers = int(os.environ.get("RHYTHM_WORKERS", min(4, multiprocessing.cpu_count())))
+# Worker đọc lại số worker để chia ngân sách RAM của cả máy (admission.memory_budget_from_env)
+os.environ["RHYTHM_WORKERS"] = str(workers)
+threads = int(os.environ.get("RHYTHM_THREADS", 2))
+worker_class = "gthread"
+
+# Tải + phân tích một bài có thể mất vài phút
+timeout = int(os.environ.get("RHYTHM_TIMEOUT", 300))
+graceful_timeout = int(os.environ.get("RHYTHM_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Tái tạo worker định kỳ để giới hạn bộ nhớ tăng dần của librosa/numba
+max_requests = int(os.environ.get("RHYTHM_MAX_REQUESTS", 50))
+max_requests_jitter = int(os.environ.get("RHYTHM_MAX_REQUESTS_JITTER", 10))
+
+accesslog = "-"
+errorlog = "-"
@@ -0,0 +1,70 @@
+import io
+import hashlib
+import numpy as np
+from storage import get_storage
+
+HOP_LENGTH = 512
+N_FFT = 2048
+SUSTAIN_WINDOW = 0.5
+HPSS_VERSION = 1
+
+
+def audio_fingerprint(audio_path):
+    h = hashlib.sha1()
+    with open(audio_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ========== HARMONIC / PERCUSSIVE SPLIT ==========
+def compute_hpss_features(y, sr, hop_length=HOP_LENGTH, n_fft=N_FFT, window_dur=SUSTAIN_WINDOW):
+    """Một lần STFT + HPSS; chỉ giữ lại các envelope theo khung (không giữ stem đầy đủ)."""
+    import librosa
+
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+    H, P = librosa.decompose.hpss(S)
+    del S
+
+    perc_env = librosa.onset.onset_strength(
+        S=librosa.power_to_db(librosa.feature.melspectrogram(S=P ** 2, sr=sr)), sr=sr, hop_length=hop_length)
+    harm_rms = librosa.feature.rms(S=H, frame_length=n_fft, hop_length=hop_length)[0]
+    perc_rms = librosa.feature.rms(S=P, frame_length=n_fft, hop_length=hop_length)[0]
+    del H, P
+
+    # sustain_ratio[f] = mean(harm_rms[f:f+W]) / (harm_rms[f] + perc_rms[f]), tính cho mọi khung bằng cumsum;
+    # chỉ phần hòa âm kéo dài mới được tính, tiếng gõ ở onset làm giảm tỉ lệ
+    w = max(1, int(round(window_dur * sr / hop_length)))
+    csum = np.concatenate([[0.0], np.cumsum(harm_rms, dtype=np.float64)])
+    n = len(harm_rms)
+    end = np.minimum(np.arange(n) + w, n)
+    window_mean = (csum[end] - csum[:n]) / (end - np.arange(n))
+    sustain = window_mean / (harm_rms + perc_rms + 1e-9)
+
+    return {
+        "perc_env": perc_env.astype(np.float32),
+        "harm_rms": harm_rms.astype(np.float32),
+        "perc_rms": perc_rms.astype(np.float32),
+        "sustain": sustain.astype(np.float32),
+    }
+
+
+# ========== CACHE (STORED NEXT TO THE SONG) ==========
+def load_or_compute_hpss(y, sr, audio_path, cache_rel):
+    storage = get_storage()
+    key = f"{audio_fingerprint(audio_path)}:{sr}:{HPSS_VERSION}"
+
+    if storage.exists(cache_rel):
+        try:
+            cached = np.load(io.BytesIO(storage.read_bytes(cache_rel)))
+            if str(cached["key"]) == key:
+                print(f"Dùng lại HPSS đã cache: {cache_rel}")
+                return {name: cached[name] for name in ("perc_env", "harm_rms", "perc_rms", "sustain")}
+        except Exception as e:
+            print(f"! Cache HPSS hỏng, tính lại: {e}")
+
+    features = compute_hpss_features(y, sr)
+    buf = io.BytesIO()
+    np.savez(buf, key=np.array(key), **features)
+    storage.write_bytes(cache_rel, buf.getvalue())
+    return features
@@ -0,0 +1,50 @@
+import numpy as np
+
+HOP_LENGTH = 512
+N_FFT = 2048
+
+# Vị trí 4 lane trên trục pan trái (-1) → phải (+1)
+LANE_PAN = np.array([-1.0, -1.0 / 3.0, 1.0 / 3.0, 1.0])
+
+
+# ========== L / R / MID / SIDE ONSETS IN ONE PASS ==========
+def stereo_onset_envelopes(y, sr, hop_length=HOP_LENGTH, n_fft=N_FFT):
+    """Onset envelope cho L, R, Mid, Side từ một buffer (2, samples).
+
+    STFT là tuyến tính nên phổ mid/side lấy từ phổ L/R, không cần tạo thêm tín hiệu mid/side.
+    Trả về mảng (4, frames) theo thứ tự L, R, M, S.
+    """
+    import librosa
+
+    D = librosa.stft(y[:2], n_fft=n_fft, hop_length=hop_length)
+    power = np.empty((4,) + D.shape[1:], dtype=np.float32)
+    np.abs(D[0], out=power[0])
+    np.abs(D[1], out=power[1])
+    np.abs(D[0] + D[1], out=power[2])
+    np.abs(D[0] - D[1], out=power[3])
+    del D
+    power[2:] *= 0.5
+    np.square(power, out=power)
+
+    mel = librosa.feature.melspectrogram(S=power, sr=sr, n_fft=n_fft, hop_length=hop_length)
+    del power
+    return librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr, hop_length=hop_length)
+
+
+def onset_pan(envs, onset_frames):
+    """Pan (-1..1) của từng onset, đẩy ra lane ngoài khi thành phần side mạnh."""
+    # onset đã backtrack về điểm trũng; lấy đỉnh trong vài khung ngay sau đó
+    frames = np.clip(np.asarray(onset_frames)[:, None] + np.arange(4), 0, envs.shape[1] - 1)
+    left, right, mid, side = envs[:, frames].max(axis=2)
+    pan = (right - left) / (right + left + 1e-9)
+    width = np.clip(side / (mid + 1e-9), 0.0, 1.0)
+    # onset ở chính giữa mà side mạnh: chọn ngẫu nhiên bên trái / phải
+    side_sign = np.where(pan == 0, np.random.choice([-1.0, 1.0], size=len(pan)), np.sign(pan))
+    return side_sign * np.maximum(np.abs(pan), width)
+
+
+# ========== LANE PICKING ==========
+def pick_lanes(count, pan):
+    """Chọn `count` lane khác nhau, ưu tiên lane gần vị trí pan của onset."""
+    w = np.exp(-((LANE_PAN - pan) ** 2) / 0.5)
+    return (np.random.choice(4, size=count, replace=False, p=w / w.sum()) + 1).tolist()
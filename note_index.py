@@ -0,0 +1,128 @@
+import numpy as np
+
+LANES = [1, 2, 3, 4]
+
+
+def _note_end(note):
+    return note["time"] + (note.get("duration", 0.0) if note["type"] == "hold" else 0.0)
+
+
+def _ms(times):
+    """Thời điểm (giây) → mili-giây nguyên; chart đã làm tròn tới ms nên phép đổi là chính xác."""
+    return np.rint(np.asarray(times, dtype=float) * 1000.0).astype(np.int64)
+
+
+# ========== SORTED-ARRAY LANE INDEX ==========
+class NoteIndex:
+    """Chỉ mục nốt theo lane: mảng start đã sắp xếp + max-end cộng dồn, truy vấn chồng lấn O(log n + k).
+
+    Thời điểm lưu bằng mili-giây nguyên (start + duration không lệch float); tham số truy vấn tính bằng giây.
+    """
+
+    def __init__(self, notes):
+        self.notes = notes
+        self.lanes = {}
+        for lane in LANES:
+            ids = np.array([i for i, n in enumerate(notes) if n["lane"] == lane], dtype=int)
+            starts = _ms([notes[i]["time"] for i in ids])
+            ends = _ms([_note_end(notes[i]) for i in ids])
+            order = np.argsort(starts, kind="stable")
+            ids, starts, ends = ids[order], starts[order], ends[order]
+            # max-end cộng dồn là mảng tăng dần nên cũng dùng được searchsorted
+            max_ends = np.maximum.accumulate(ends) if len(ends) else ends
+            self.lanes[lane] = (ids, starts, ends, max_ends)
+
+        holds = [n for n in notes if n["type"] == "hold"]
+        self.hold_starts = np.sort(_ms([n["time"] for n in holds]))
+        self.hold_ends = np.sort(_ms([_note_end(n) for n in holds]))
+
+    def overlapping(self, lane, t0, t1):
+        """Chỉ số các nốt trong lane giao với [t0, t1] (tính cả đầu mút)."""
+        return self.lanes[lane][0][self._overlapping_ms(lane, *_ms([t0, t1]))]
+
+    def _overlapping_ms(self, lane, t0, t1):
+        """Vị trí (trong mảng của lane) các nốt giao với [t0, t1] mili-giây."""
+        _, starts, ends, max_ends = self.lanes[lane]
+        lo = np.searchsorted(max_ends, t0, side="left")
+        hi = np.searchsorted(starts, t1, side="right")
+        cand = np.arange(lo, hi)
+        return cand[ends[cand] >= t0]
+
+    def active_holds(self, times):
+        """Số hold đang giữ tại mỗi thời điểm: bắt đầu trước t và kết thúc sau t (vector hóa)."""
+        return self._active_holds_ms(_ms(times))
+
+    def _active_holds_ms(self, times):
+        return (np.searchsorted(self.hold_starts, times, side="left")
+                - np.searchsorted(self.hold_ends, times, side="right"))
+
+
+# ========== VALIDATION + REPAIR ==========
+def validate_beatmap(beatmap_data, min_gap=0.06, min_hold=0.35, max_concurrent=3, repair=True):
+    """Kiểm tra và sửa: trùng lane, hold chồng nốt sau, khoảng cách tối thiểu, hợp âm quá tải.
+
+    So sánh trên mili-giây nguyên: hai nốt cách đúng min_gap là hợp lệ, không phụ thuộc sai số float.
+    """
+    notes = beatmap_data["beats"]
+    report = {"lane_collisions": 0, "hold_overlaps": 0, "min_gap": 0, "chord_overload": 0}
+    if not notes:
+        return beatmap_data, report
+
+    index = NoteIndex(notes)
+    gap_ms, hold_ms = int(round(min_gap * 1000.0)), int(round(min_hold * 1000.0))
+    drop = np.zeros(len(notes), dtype=bool)
+    clip = {}
+
+    for lane in LANES:
+        ids, starts, ends, _ = index.lanes[lane]
+        last_t = None
+        for i, t in zip(ids, starts):
+            if last_t is not None and t == last_t:
+                report["lane_collisions"] += 1
+                drop[i] = True
+            elif last_t is not None and t - last_t < gap_ms:
+                report["min_gap"] += 1
+                drop[i] = True
+            else:
+                last_t = t
+
+        # hold phải kết thúc trước nốt kế tiếp cùng lane: truy vấn index trên (start, end + min_gap)
+        for i, t, end in zip(ids, starts, ends):
+            if drop[i] or notes[i]["type"] != "hold":
+                continue
+            pos = index._overlapping_ms(lane, t + 1, end + gap_ms - 1)
+            later = starts[pos][(starts[pos] > t) & ~drop[ids[pos]]]
+            if len(later):
+                report["hold_overlaps"] += 1
+                clip[i] = max(0, int(later.min() - t - gap_ms))
+
+    # chart sau các bước trên: nốt đã bỏ không tính, hold đã cắt theo độ dài mới, hold cắt quá ngắn thành tap
+    survivors = []
+    for i, n in enumerate(notes):
+        if drop[i]:
+            continue
+        if i in clip:
+            n = dict(n)
+            if clip[i] < hold_ms:
+                n["type"] = "tap"
+                n.pop("duration", None)
+            else:
+                n["duration"] = clip[i] / 1000.0
+        survivors.append((i, n))
+
+    # số nốt cùng lúc = nốt bắt đầu tại t + hold khác lane đang giữ, tính trên chart đã sửa
+    repaired = NoteIndex([n for _, n in survivors])
+    alive = np.array([i for i, _ in survivors], dtype=int)
+    times = _ms([n["time"] for _, n in survivors])
+    uniq, inverse, counts = np.unique(times, return_inverse=True, return_counts=True)
+    overload = counts + repaired._active_holds_ms(uniq) - max_concurrent
+    groups = np.split(alive[np.argsort(inverse, kind="stable")], np.cumsum(counts)[:-1])
+    for u in np.nonzero(overload > 0)[0]:
+        members = sorted(groups[u], key=lambda i: notes[i]["energy"])
+        for i in members[:overload[u]]:
+            report["chord_overload"] += 1
+            drop[i] = True
+
+    if repair:
+        beatmap_data["beats"] = [n for i, n in survivors if not drop[i]]
+    return beatmap_data, report
@@ -0,0 +1,117 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+HOP_LENGTH = 512
+N_FFT = 2048
+
+
+# ========== PEAK PICKING (NUMPY) ==========
+def pick_peaks(env, sr, hop_length=HOP_LENGTH, delta=0.07):
+    """Peak picking vector hóa, cùng tham số mặc định với librosa.onset.onset_detect."""
+    fps = sr / hop_length
+    pre_max, post_max = int(0.03 * fps), int(0.00 * fps) + 1
+    pre_avg, post_avg = int(0.10 * fps), int(0.10 * fps) + 1
+    wait = int(0.03 * fps)
+
+    x = (env - env.min()) / (env.max() - env.min() + 1e-9)
+    n = len(x)
+    padded_max = np.pad(x, (pre_max, post_max), mode="constant", constant_values=-np.inf)
+    mov_max = sliding_window_view(padded_max, pre_max + post_max)[:n]
+    padded_avg = np.pad(x, (pre_avg, post_avg), mode="edge")
+    mov_avg = sliding_window_view(padded_avg, pre_avg + post_avg)[:n].mean(axis=1)
+    candidates = np.nonzero((x >= mov_max.max(axis=1)) & (x >= mov_avg + delta))[0]
+
+    peaks, last = [], -np.inf
+    for c in candidates:
+        if c > last + wait:
+            peaks.append(c)
+            last = c
+    return np.array(peaks, dtype=int)
+
+
+def backtrack_peaks(peaks, env):
+    """Lùi mỗi đỉnh về cực tiểu cục bộ gần nhất trước nó."""
+    minima = np.flatnonzero((env[1:-1] <= env[:-2]) & (env[1:-1] < env[2:])) + 1
+    if len(minima) == 0 or len(peaks) == 0:
+        return peaks
+    idx = np.searchsorted(minima, peaks, side="right") - 1
+    return np.where(idx >= 0, minima[np.maximum(idx, 0)], peaks)
+
+
+# ========== ENGINES ==========
+class OnsetEngine:
+    """Trả về (onset_frames, onset_env) với hop 512, như extract_beats đang dùng.
+
+    backtrack=False trả về khung đỉnh (dùng khi chấm điểm, vì backtrack lùi onset sớm tới ~60 ms).
+    """
+    name = "base"
+
+    def detect(self, y, sr, backtrack=True):
+        raise NotImplementedError
+
+
+class LibrosaEngine(OnsetEngine):
+    """Mặc định hiện tại: mel spectral flux của librosa + onset_detect(backtrack=True)."""
+    name = "librosa"
+
+    def detect(self, y, sr, backtrack=True):
+        import librosa
+
+        env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=HOP_LENGTH)
+        frames = librosa.onset.onset_detect(onset_envelope=env, sr=sr, hop_length=HOP_LENGTH, backtrack=backtrack)
+        return frames, env
+
+
+class SpectralFluxEngine(OnsetEngine):
+    """Chế độ nhanh: spectral flux log-magnitude thuần NumPy, không cần librosa."""
+    name = "spectral_flux"
+
+    def __init__(self, n_fft=1024):
+        self.n_fft = n_fft
+
+    def detect(self, y, sr, backtrack=True):
+        y = np.asarray(y, dtype=np.float32)
+        pad = self.n_fft // 2
+        frames = sliding_window_view(np.pad(y, (pad, pad)), self.n_fft)[::HOP_LENGTH]
+        window = np.hanning(self.n_fft + 1)[:-1].astype(np.float32)
+        mag = np.log1p(100.0 * np.abs(np.fft.rfft(frames * window, axis=1)))
+        flux = np.maximum(0.0, np.diff(mag, axis=0)).mean(axis=1)
+        env = np.concatenate([[0.0], flux])
+        peaks = pick_peaks(env, sr)
+        return (backtrack_peaks(peaks, env) if backtrack else peaks), env
+
+
+class SuperFluxEngine(OnsetEngine):
+    """Đa băng tần kiểu SuperFlux: mel 138 băng, lag 2, lọc max theo tần số để bỏ vibrato."""
+    name = "superflux"
+
+    def __init__(self, n_mels=138, lag=2, max_size=3):
+        self.n_mels = n_mels
+        self.lag = lag
+        self.max_size = max_size
+
+    def detect(self, y, sr, backtrack=True):
+        import librosa
+
+        S = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                                           fmin=27.5, fmax=min(16000.0, sr / 2), n_mels=self.n_mels)
+        env = librosa.onset.onset_strength(S=librosa.power_to_db(S), sr=sr, hop_length=HOP_LENGTH,
+                                           lag=self.lag, max_size=self.max_size)
+        frames = librosa.onset.onset_detect(onset_envelope=env, sr=sr, hop_length=HOP_LENGTH, backtrack=backtrack)
+        return frames, env
+
+
+ENGINES = {
+    LibrosaEngine.name: LibrosaEngine,
+    SpectralFluxEngine.name: SpectralFluxEngine,
+    SuperFluxEngine.name: SuperFluxEngine,
+}
+
+
+def get_engine(name=None):
+    if isinstance(name, OnsetEngine):
+        return name
+    try:
+        return ENGINES[name or LibrosaEngine.name]()
+    except KeyError:
+        raise ValueError(f"Không có onset engine '{name}'. Chọn một trong: {', '.join(ENGINES)}")
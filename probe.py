@@ -0,0 +1,51 @@
+import os
+
+# Bài dài hơn MAX_DURATION bị từ chối; dài hơn STREAMING_DURATION thì phân tích theo luồng
+MAX_DURATION = float(os.environ.get("RHYTHM_MAX_DURATION", 1200))
+STREAMING_DURATION = float(os.environ.get("RHYTHM_STREAMING_DURATION", 600))
+
+
+# ========== REMOTE (yt-dlp info dict, no download) ==========
+def probe_remote(audio_link):
+    """Đọc metadata từ yt-dlp mà không tải/decode; trả về None nếu không đọc được."""
+    import yt_dlp
+
+    try:
+        with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True, 'format': 'bestaudio/best'}) as ydl:
+            info = ydl.extract_info(audio_link, download=False)
+    except Exception as e:
+        print(f"! Không probe được {audio_link}: {e}")
+        return None
+    if not info or not info.get("duration"):
+        return None
+    return {
+        "duration": float(info["duration"]),
+        "sr": int(info["asr"]) if info.get("asr") else None,
+        "channels": int(info["audio_channels"]) if info.get("audio_channels") else None,
+        "source": "yt-dlp",
+    }
+
+
+# ========== LOCAL FILE (container header only) ==========
+def probe_file(audio_path):
+    """Đọc duration / sample rate / số kênh từ header file qua decode.probe_audio, không decode toàn bộ."""
+    from decode import probe_audio
+
+    return probe_audio(audio_path)
+
+
+# ========== ROUTING ==========
+def too_long_message(info):
+    return f"Bài nhạc quá dài ({info['duration']:.0f}s > {MAX_DURATION:.0f}s)!"
+
+
+
+def choose_mode(info):
+    """'reject' nếu quá dài, 'streaming' nếu dài, còn lại 'offline'."""
+    if not info:
+        return "offline"
+    if info["duration"] > MAX_DURATION:
+        return "reject"
+    if info["duration"] > STREAMING_DURATION:
+        return "streaming"
+    return "offline"
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+
+# Khoảng lấy mẫu mặc định (giây); 5ms đủ mịn cho bài vài phút mà overhead nhỏ
+PROFILE_INTERVAL = float(os.environ.get("RHYTHM_PROFILE_INTERVAL", 0.005))
+PROFILE_FORMATS = {"collapsed": "collapsed.txt", "speedscope": "speedscope.json"}
+
+
+# ========== SAMPLING PROFILER (PURE PYTHON, NO DEPENDENCIES) ==========
+class SamplingProfiler:
+    """Lấy mẫu stack của một thread theo chu kỳ từ một thread phụ.
+
+    Thời gian nằm trong C (ffmpeg/audioread, kernel numba, numpy, matplotlib) được tính cho
+    frame Python đang gọi nó, nên flamegraph vẫn chỉ ra bước nào của pipeline tốn thời gian.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()     # stack (root → leaf) → số mẫu
+        self.weights = Counter()     # stack → tổng thời gian (giây)
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+        self._skip = 0
+
+    def start(self):
+        self._target = threading.get_ident()
+        # bỏ các frame phía trên điểm bắt đầu (Flask, CLI...) để stack gốc là hàm được profile
+        frame, self._skip = sys._getframe(1), 0
+        while frame is not None:
+            self._skip += 1
+            frame = frame.f_back
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rhythm-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack = tuple(reversed(stack))[self._skip:]
+            if stack:
+                self.samples[stack] += 1
+                self.weights[stack] += now - last
+            last = now
+
+    # ---------- output ----------
+    def to_collapsed(self):
+        """Định dạng collapsed stack của flamegraph.pl / speedscope / inferno."""
+        return "".join(f"{';'.join(f.replace(';', ',') for f in stack)} {n}\n"
+                       for stack, n in self.samples.most_common())
+
+    def to_speedscope(self, name="rhythm_ai"):
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, seconds in self.weights.items():
+            ids = []
+            for f in stack:
+                if f not in index:
+                    index[f] = len(frames)
+                    frames.append({"name": f})
+                ids.append(index[f])
+            samples.append(ids)
+            weights.append(round(seconds * 1000.0, 3))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{"type": "sampled", "name": name, "unit": "milliseconds",
+                          "startValue": 0, "endValue": round(sum(weights), 3),
+                          "samples": samples, "weights": weights}],
+            "name": name,
+            "exporter": "rhythm_ai profiling.py",
+        }
+
+    def render(self, fmt, name="rhythm_ai"):
+        if fmt == "speedscope":
+            return json.dumps(self.to_speedscope(name))
+        return self.to_collapsed()
+
+
+def profile_format(value):
+    """Chuẩn hóa giá trị header / tham số: None khi tắt, còn lại là tên định dạng."""
+    if value is None or value is False:
+        return None
+    value = str(value).strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    if value in ("1", "true", "yes", "on"):
+        return "collapsed"
+    if value not in PROFILE_FORMATS:
+        raise ValueError(f"Định dạng profile không hợp lệ '{value}', chọn một trong: {', '.join(PROFILE_FORMATS)}")
+    return value
+
+
+def run_profiled(fn, storage, rel_dir, name, fmt="collapsed", interval=PROFILE_INTERVAL):
+    """Chạy fn() dưới profiler, lưu file vào storage (kể cả khi fn lỗi); trả về (kết quả, rel_path)."""
+    rel_path = f"{rel_dir}/{name}_{time.strftime('%Y%m%d-%H%M%S')}.{PROFILE_FORMATS[fmt]}"
+    profiler = SamplingProfiler(interval).start()
+    try:
+        result = fn()
+    finally:
+        profiler.stop()
+        storage.write_text(rel_path, profiler.render(fmt, name))
+        print(f"Đã lưu profile ({fmt}, {sum(profiler.samples.values())} mẫu): {rel_path}")
+    return result, rel_path
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import glob
+import numpy as np
+
+BIN = 0.25          # độ phân giải chuỗi (giây)
+WINDOW = 2.0        # cửa sổ trượt tính mật độ
+RATING_VERSION = 1
+
+
+# ========== SERIES (ONE VECTORIZED PASS, O(n + bins)) ==========
+def chart_series(notes, bin_size=BIN, window=WINDOW):
+    """Chuỗi mật độ nốt/giây, tỉ lệ hợp âm và số hold chồng nhau trên lưới bin cố định."""
+    if not notes:
+        return np.zeros((3, 0))
+    times = np.fromiter((n["time"] for n in notes), dtype=float, count=len(notes))
+    ends = np.fromiter((n["time"] + n.get("duration", 0.0) if n["type"] == "hold" else n["time"]
+                        for n in notes), dtype=float, count=len(notes))
+    is_hold = np.fromiter((n["type"] == "hold" for n in notes), dtype=bool, count=len(notes))
+
+    n_bins = int(max(ends.max(), times.max()) // bin_size) + 2
+    bins = (times // bin_size).astype(int)
+    counts = np.bincount(bins, minlength=n_bins).astype(float)
+
+    # hợp âm: mỗi thời điểm có >1 nốt tính là một hợp âm (beatmap đã sắp theo thời gian)
+    order = np.arange(len(times)) if np.all(times[1:] >= times[:-1]) else np.argsort(times, kind="stable")
+    st = times[order]
+    chord_start = np.flatnonzero((st[1:] == st[:-1]) & np.concatenate([[True], st[1:-1] != st[:-2]]))
+    chord_bins = (st[chord_start] // bin_size).astype(int)
+    chords = np.bincount(chord_bins, minlength=n_bins).astype(float)
+
+    # hold đang giữ: mảng hiệu +1 ở đầu, -1 ở cuối rồi cộng dồn
+    diff = np.zeros(n_bins + 1)
+    np.add.at(diff, bins[is_hold], 1.0)
+    np.add.at(diff, (ends[is_hold] // bin_size).astype(int) + 1, -1.0)
+    holds = np.cumsum(diff)[:n_bins]
+
+    # tổng trượt theo cửa sổ bằng cumsum
+    w = max(1, int(round(window / bin_size)))
+    def moving(x):
+        c = np.concatenate([[0.0], np.cumsum(x)])
+        return (c[w:] - c[:-w]) if len(x) >= w else np.array([c[-1]])
+    density = moving(counts) / window
+    chord_rate = moving(chords) / window
+    hold_overlap = moving(holds) / (w if len(holds) >= w else len(holds))
+    return np.vstack([density, chord_rate, hold_overlap])
+
+
+# ========== STAR RATING ==========
+def rate_chart(notes, bin_size=BIN, window=WINDOW, top_segments=3):
+    series = chart_series(notes, bin_size, window)
+    if series.shape[1] == 0:
+        return {"stars": 0.0, "version": RATING_VERSION, "peak_nps": 0.0, "mean_nps": 0.0,
+                "chord_rate": 0.0, "hold_overlap": 0.0, "peaks": []}
+    density, chord_rate, hold_overlap = series
+    strain = density + 0.5 * chord_rate + 0.75 * hold_overlap
+
+    score = 0.7 * np.percentile(strain, 95) + 0.3 * strain.mean()
+    stars = float(np.clip(1.2 * score ** 0.8, 0.0, 10.0))
+
+    # đoạn cao điểm: các dải bin liên tục có strain >= p90
+    hot = strain >= np.percentile(strain, 90)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], hot.astype(int), [0]])))
+    runs = edges.reshape(-1, 2)
+    peaks = []
+    for s, e in runs:
+        k = s + int(np.argmax(density[s:e]))
+        peaks.append({"start": round(float(s * bin_size), 3), "end": round(float((e - 1) * bin_size + window), 3),
+                      "peak_nps": round(float(density[k]), 2)})
+    peaks.sort(key=lambda p: -p["peak_nps"])
+
+    return {
+        "stars": round(stars, 2),
+        "version": RATING_VERSION,
+        "peak_nps": round(float(density.max()), 2),
+        "mean_nps": round(float(density.mean()), 2),
+        "chord_rate": round(float(chord_rate.mean()), 3),
+        "hold_overlap": round(float(hold_overlap.mean()), 3),
+        "peaks": peaks[:top_segments],
+    }
+
+
+# ========== WHOLE-LIBRARY BATCH ==========
+def rate_library(songs_root, write=False):
+    """Chấm điểm mọi beatmap trong thư mục songs (songs/<title>/beatmaps/*.json)."""
+    results = {}
+    for path in sorted(glob.glob(os.path.join(songs_root, "*", "beatmaps", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["rating"] = rate_chart(data.get("beats", []))
+        results[path] = data["rating"]
+        if write:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Cách dùng: python rating.py <thư mục songs> [--write]")
+        sys.exit(1)
+    for path, r in rate_library(sys.argv[1], write="--write" in sys.argv).items():
+        print(f"{r['stars']:5.2f}★  {r['peak_nps']:5.2f} nps  {os.path.basename(path)}")
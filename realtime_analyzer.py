@@ -0,0 +1,336 @@
+import sys
+import time
+import random
+import numpy as np
+
+# Cùng thông số với extract_beats / generate_beatmap_json (offline)
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TOP_DB = 80.0
+
+DIFFICULTY_PARAMS = {
+    "easy": (3, 0.05, 0.00),
+    "normal": (2, 0.15, 0.05),
+    "hard": (1, 0.25, 0.10),
+}
+
+
+# ========== FRAME FEATURES (SHARED BY ALL DIFFICULTIES) ==========
+class FrameFeatures:
+    """RMS + onset envelope + peak picking trên luồng PCM.
+
+    Không phụ thuộc độ khó nên analyze_file_stream chỉ tính một lần rồi chia cho mọi StreamingAnalyzer.
+    """
+
+    def __init__(self, sr):
+        import librosa
+
+        self.sr = sr
+        self.window = np.hanning(FRAME_LENGTH + 1)[:-1].astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=FRAME_LENGTH, n_mels=N_MELS)
+
+        # Tham số peak picking giống librosa.onset.onset_detect
+        fps = sr / HOP_LENGTH
+        self.pre_max = int(0.03 * fps)
+        self.post_max = int(0.00 * fps) + 1
+        self.pre_avg = int(0.10 * fps)
+        self.post_avg = int(0.10 * fps) + 1
+        self.wait = int(0.03 * fps)
+        self.delta = 0.07
+
+        # center=True: khung 0 được đệm n_fft/2 mẫu 0 ở đầu
+        self._buf = np.zeros(FRAME_LENGTH // 2, dtype=np.float32)
+        self._buf_start = -(FRAME_LENGTH // 2)
+        self._n_samples = 0
+
+        self.rms = []
+        # librosa.onset.onset_strength đệm thêm n_fft // (2 * hop) khung ở đầu envelope
+        self.env = [0.0] * (FRAME_LENGTH // (2 * HOP_LENGTH))
+        self._prev_db = None
+        self._db_max = -np.inf
+        self._env_min, self._env_max = np.inf, -np.inf
+        # min / max của envelope tính tới từng khung: peak picking chuẩn hóa theo đúng các khung nó cần,
+        # không theo những gì block hiện tại tình cờ đã chứa (kết quả không phụ thuộc kích thước block)
+        self._env_range = [(np.inf, -np.inf)] * len(self.env)
+        self._next_peak_frame = 1
+        self._last_onset = -np.inf
+
+    def _process_frame(self, frame):
+        self.rms.append(float(np.sqrt(np.mean(frame ** 2))))
+
+        spec = np.abs(np.fft.rfft(frame * self.window)) ** 2
+        mel_db = 10.0 * np.log10(np.maximum(1e-10, self.mel_basis @ spec))
+        self._db_max = max(self._db_max, float(mel_db.max()))
+        mel_db = np.maximum(mel_db, self._db_max - TOP_DB)
+
+        if self._prev_db is None:
+            flux = 0.0
+        else:
+            flux = float(np.mean(np.maximum(0.0, mel_db - self._prev_db)))
+        self._prev_db = mel_db
+        self.env.append(flux)
+        self._env_min = min(self._env_min, flux)
+        self._env_max = max(self._env_max, flux)
+        self._env_range.append((self._env_min, self._env_max))
+
+    # ---------- onset peak picking (bounded lookahead) ----------
+    def _pick_peaks(self):
+        env = self.env
+        found = []
+        while self._next_peak_frame + self.post_avg < len(env):
+            n = self._next_peak_frame
+            self._next_peak_frame += 1
+            lo_max, hi_max = max(0, n - self.pre_max), n + self.post_max
+            if env[n] < max(env[lo_max:hi_max]):
+                continue
+            lo_avg, hi_avg = max(0, n - self.pre_avg), n + self.post_avg
+            env_min, env_max = self._env_range[hi_avg - 1]
+            scale = env_max - env_min + 1e-9
+            norm_n = (env[n] - env_min) / scale
+            norm_avg = (np.mean(env[lo_avg:hi_avg]) - env_min) / scale
+            if norm_n < norm_avg + self.delta or n <= self._last_onset + self.wait:
+                continue
+            self._last_onset = n
+
+            # backtrack về cực tiểu gần nhất trước đỉnh
+            k = n
+            while k > 0 and env[k - 1] <= env[k]:
+                k -= 1
+            found.append(k)
+        return found
+
+    def onset_frontier(self):
+        """Khung nhỏ nhất mà một onset chưa tìm thấy còn có thể rơi vào.
+
+        Đỉnh chưa xét nằm từ _next_peak_frame trở đi; backtrack từ đó chỉ lùi được tới cực tiểu gần nhất trước nó.
+        """
+        env = self.env
+        k = min(self._next_peak_frame, len(env) - 1)
+        while k > 0 and env[k - 1] <= env[k]:
+            k -= 1
+        return k
+
+    def push(self, block):
+        """Nhận một block PCM (mono hoặc (samples, channels)), trả về khung onset mới tìm được."""
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim > 1:
+            block = block.mean(axis=1)
+
+        self._buf = np.concatenate([self._buf, block])
+        self._n_samples += len(block)
+
+        # khung i phủ mẫu [i*hop - n_fft/2, i*hop + n_fft/2)
+        i = len(self.rms)
+        while i * HOP_LENGTH + FRAME_LENGTH // 2 <= self._n_samples:
+            lo = i * HOP_LENGTH - FRAME_LENGTH // 2 - self._buf_start
+            self._process_frame(self._buf[lo:lo + FRAME_LENGTH])
+            i += 1
+        drop = max(0, (i * HOP_LENGTH - FRAME_LENGTH // 2) - self._buf_start)
+        if drop:
+            self._buf = self._buf[drop:]
+            self._buf_start += drop
+        return self._pick_peaks()
+
+    def flush(self):
+        """Kết thúc luồng (đệm 0 ở cuối giống center=True), trả về các khung onset còn lại."""
+        self._buf = np.concatenate([self._buf, np.zeros(FRAME_LENGTH // 2, dtype=np.float32)])
+        i = len(self.rms)
+        while i * HOP_LENGTH <= self._n_samples:
+            lo = i * HOP_LENGTH - FRAME_LENGTH // 2 - self._buf_start
+            self._process_frame(self._buf[lo:lo + FRAME_LENGTH])
+            i += 1
+        return self._pick_peaks()
+
+
+# ========== STREAMING ANALYZER ==========
+class StreamingAnalyzer:
+    """Phân tích nhạc theo từng block PCM, sinh nốt với độ trễ (lookahead) giới hạn.
+
+    Dùng lại logic của extract_beats (onset + lọc năng lượng RMS) và bước kiểm tra
+    sustain của generate_beatmap_json, nhưng chỉ nhìn trước tối đa `lookahead` giây.
+    Truyền `features` để dùng chung một FrameFeatures giữa nhiều độ khó; khi đó gọi feed() thay cho push().
+    Một nốt chỉ được chốt khi mọi onset trong khoảng lookahead sau nó đã biết, và mỗi analyzer có `rng` riêng,
+    nên cùng audio + cùng seed cho cùng chart với mọi kích thước block.
+    """
+
+    def __init__(self, sr, difficulty="hard", lookahead=0.2, energy_threshold=0.03,
+                 min_gap=0.06, min_hold=0.35, energy_hold_ratio=0.6, window_dur=0.5, features=None, rng=None):
+        self.sr = sr
+        self.difficulty = difficulty
+        self.energy_threshold = energy_threshold
+        self.min_gap = min_gap
+        self.min_hold = min_hold
+        self.energy_hold_ratio = energy_hold_ratio
+        self.window_dur = window_dur
+        self.step, self.double_p, self.triple_p = DIFFICULTY_PARAMS[difficulty]
+
+        self.features = features or FrameFeatures(sr)
+        fps = sr / HOP_LENGTH
+        self.lookahead_frames = max(int(round(lookahead * fps)), self.features.post_avg, self.features.post_max)
+        self.lookahead = self.lookahead_frames / fps
+
+        self._pending = []
+        self._seen = []         # mọi onset đủ năng lượng (idx, e), để cập nhật _strength_max theo thời gian
+        self._onset_count = 0
+        self._strength_max = energy_threshold
+        # analyzer các độ khó chốt nốt xen kẽ nhau tùy block: mỗi analyzer một dãy ngẫu nhiên riêng
+        self.rng = rng or random.Random(random.random())
+
+        self.block_latencies = []
+        self.notes = []
+
+    # ---------- streaming sustain check ----------
+    def _sustain_ratio(self, idx):
+        # Offline nhìn 0.5 s sau onset; ở đây cửa sổ bị cắt ở lookahead
+        rms = self.features.rms
+        end_idx = min(idx + int(self.window_dur * self.sr / HOP_LENGTH), len(rms), idx + self.lookahead_frames)
+        energy_window = rms[idx:end_idx] if end_idx > idx else [rms[idx]]
+        return float(np.mean(energy_window)) / (rms[idx] + 1e-9)
+
+    def _emit_ready(self, final=False):
+        emitted = []
+        fps = self.sr / HOP_LENGTH
+        n_frames = len(self.features.rms)
+        known = n_frames if final else min(n_frames, self.features.onset_frontier())
+        while self._pending and (final or self._pending[0][0] + self.lookahead_frames < known):
+            idx, e_raw = self._pending.pop(0)
+            t = idx / fps
+            horizon = idx + self.lookahead_frames
+            while self._seen and self._seen[0][0] <= horizon:
+                self._strength_max = max(self._strength_max, self._seen.pop(0)[1])
+            # Offline chuẩn hóa min-max trên cả bài; khi stream chỉ biết max hiện tại,
+            # lấy energy_threshold làm mức sàn để onset đầu tiên không bị coi là yếu nhất
+            e = (e_raw - self.energy_threshold) / (self._strength_max - self.energy_threshold + 1e-9)
+            if e < 0.05:
+                continue
+
+            r = self.rng.random()
+            if r < self.triple_p and e > 0.7:
+                count = 3
+            elif r < self.double_p + self.triple_p and e > 0.5:
+                count = 2
+            else:
+                count = 1
+
+            # Chỉ dùng các onset trong khoảng lookahead (onset xa hơn có biết hay chưa là tùy block)
+            ahead = [p for p, _ in self._pending if p <= horizon]
+            next_t = min(ahead) / fps if ahead else None
+
+            for lane in self.rng.sample([1, 2, 3, 4], count):
+                sustain_ratio = self._sustain_ratio(idx)
+                note_type, duration = "tap", 0.0
+                if sustain_ratio > self.energy_hold_ratio:
+                    duration = self.window_dur * sustain_ratio * self.rng.uniform(0.8, 1.5)
+                    if next_t:
+                        duration = min(duration, max(0.0, next_t - t - self.min_gap))
+                    if duration >= self.min_hold:
+                        note_type = "hold"
+                    else:
+                        duration = 0.0
+
+                note = {
+                    "time": round(float(t), 3),
+                    "lane": int(lane),
+                    "type": note_type,
+                    "energy": round(float(e), 3)
+                }
+                if note_type == "hold":
+                    note["duration"] = round(float(duration), 3)
+                emitted.append(note)
+        self.notes.extend(emitted)
+        return emitted
+
+    # ---------- public API ----------
+    def push(self, block):
+        """Nhận một block PCM (mono hoặc (samples, channels)), trả về các nốt đã chốt."""
+        start = time.perf_counter()
+        emitted = self.feed(self.features.push(block))
+        self.block_latencies.append(time.perf_counter() - start)
+        return emitted
+
+    def flush(self):
+        """Kết thúc luồng: chốt các nốt còn chờ."""
+        start = time.perf_counter()
+        emitted = self.feed(self.features.flush(), final=True)
+        self.block_latencies.append(time.perf_counter() - start)
+        return emitted
+
+    def feed(self, onset_frames, final=False):
+        """Nhận các khung onset mới từ FrameFeatures (dùng chung), trả về các nốt đã chốt."""
+        rms = self.features.rms
+        for idx in onset_frames:
+            e = rms[idx]
+            if e <= self.energy_threshold:
+                continue
+            self._seen.append((idx, e))
+            if self._onset_count % self.step == 0:
+                self._pending.append((idx, e))
+            self._onset_count += 1
+        return self._emit_ready(final=final)
+
+    def latency_stats(self):
+        return latency_stats(self.block_latencies, self.lookahead)
+
+
+def latency_stats(block_latencies, lookahead):
+    if not block_latencies:
+        return {"blocks": 0}
+    lat = np.array(block_latencies) * 1000.0
+    return {
+        "blocks": int(len(lat)),
+        "mean_ms": round(float(lat.mean()), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "max_ms": round(float(lat.max()), 3),
+        "lookahead_ms": round(lookahead * 1000.0, 1),
+    }
+
+
+# ========== FEED A FILE IN BLOCKS ==========
+def analyze_file_stream(audio_path, difficulties=("easy", "normal", "hard"), block_size=4096, lookahead=0.2,
+                        with_features=False):
+    """Đọc file theo block qua decode.open_stream (một lần decode), tính đặc trưng khung một lần
+    rồi chia cho analyzer của từng độ khó. Độ trễ mỗi block tính cho cả nhóm độ khó.
+
+    with_features=True: trả về (kết quả, FrameFeatures) để dùng lại envelope (vd. tempo cả bài).
+    """
+    from decode import open_stream
+
+    sr, blocks = open_stream(audio_path, block_frames=block_size)
+    features = FrameFeatures(sr)
+    analyzers = {d: StreamingAnalyzer(sr, difficulty=d, lookahead=lookahead, features=features)
+                 for d in difficulties}
+    latencies = []
+    for block in blocks:
+        start = time.perf_counter()
+        onsets = features.push(block)
+        for analyzer in analyzers.values():
+            analyzer.feed(onsets)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    onsets = features.flush()
+    for analyzer in analyzers.values():
+        analyzer.feed(onsets, final=True)
+    latencies.append(time.perf_counter() - start)
+
+    results = {}
+    for d, analyzer in analyzers.items():
+        analyzer.notes.sort(key=lambda n: (n["time"], n["lane"]))
+        results[d] = ({"difficulty": d, "beats": analyzer.notes}, latency_stats(latencies, analyzer.lookahead))
+    return (results, features) if with_features else results
+
+
+def analyze_wav_stream(audio_path, block_size=1024, difficulty="hard", lookahead=0.2):
+    return analyze_file_stream(audio_path, (difficulty,), block_size, lookahead)[difficulty]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Cách dùng: python realtime_analyzer.py <file nhạc> [block_size] [difficulty]")
+        sys.exit(1)
+    block_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    difficulty = sys.argv[3] if len(sys.argv) > 3 else "hard"
+    beatmap, stats = analyze_wav_stream(sys.argv[1], block_size=block_size, difficulty=difficulty)
+    print(f"Số nốt: {len(beatmap['beats'])}")
+    print(f"Độ trễ mỗi block: {stats}")
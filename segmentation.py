@@ -0,0 +1,82 @@
+import numpy as np
+
+HOP_LENGTH = 512
+SECONDS_PER_SECTION = 20.0
+
+
+# ========== SECTION TABLE ==========
+class SectionTable:
+    """Bảng đoạn nhạc đã sắp xếp theo thời gian, tra cứu O(log n) bằng searchsorted."""
+
+    def __init__(self, starts, ends, labels, energy):
+        self.starts = np.asarray(starts, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        self.labels = list(labels)
+        self.energy = np.asarray(energy, dtype=float)
+        # Mật độ nốt theo đoạn: đoạn yên thưa hơn, điệp khúc dày nhất
+        self.density = 0.5 + 0.5 * self.energy
+
+    def __len__(self):
+        return len(self.starts)
+
+    def index_of(self, times):
+        idx = np.searchsorted(self.starts, times, side="right") - 1
+        return np.clip(idx, 0, max(len(self.starts) - 1, 0))
+
+    def lookup(self, t):
+        i = int(self.index_of(t))
+        return {"label": self.labels[i], "start": float(self.starts[i]), "end": float(self.ends[i]),
+                "energy": float(self.energy[i])}
+
+    def density_at(self, times):
+        if len(self) == 0:
+            return np.ones(np.shape(times))
+        return self.density[self.index_of(times)]
+
+    def to_list(self):
+        return [
+            {"label": lb, "start": round(float(s), 3), "end": round(float(e), 3), "energy": round(float(en), 3)}
+            for s, e, lb, en in zip(self.starts, self.ends, self.labels, self.energy)
+        ]
+
+
+# ========== SEGMENTATION FROM ANALYSIS FEATURES ==========
+def compute_sections(rms, onset_env, grid_beats, sr, duration, hop_length=HOP_LENGTH):
+    """Chia bài thành intro / verse / chorus / outro từ RMS và onset envelope đã có."""
+    import librosa
+
+    n = min(len(rms), len(onset_env))
+    if duration <= 0 or n == 0:
+        return SectionTable([], [], [], [])
+
+    beat_frames = librosa.time_to_frames(grid_beats, sr=sr, hop_length=hop_length)
+    beat_frames = beat_frames[(beat_frames > 0) & (beat_frames < n)]
+    rms_db = librosa.amplitude_to_db(rms[:n], ref=np.max)
+    features = np.vstack([rms_db, onset_env[:n]])
+    features = (features - features.mean(axis=1, keepdims=True)) / (features.std(axis=1, keepdims=True) + 1e-9)
+
+    k = int(np.clip(round(duration / SECONDS_PER_SECTION), 1, 12))
+    if len(beat_frames) >= 2 * k and k > 1:
+        synced = librosa.util.sync(features, beat_frames, aggregate=np.mean)
+        bounds = librosa.segment.agglomerative(synced, k)
+        frame_bounds = np.concatenate([[0], beat_frames])[bounds]
+    else:
+        frame_bounds = np.array([0])
+
+    starts = librosa.frames_to_time(frame_bounds, sr=sr, hop_length=hop_length)
+    starts[0] = 0.0
+    ends = np.append(starts[1:], duration)
+
+    # năng lượng trung bình mỗi đoạn, một lần reduceat
+    edges = np.append(frame_bounds, n)
+    counts = np.maximum(np.diff(edges), 1)
+    energy = np.add.reduceat(rms[:n], frame_bounds) / counts
+    energy = (energy - energy.min()) / (energy.max() - energy.min() + 1e-9) if len(energy) > 1 else np.ones(1)
+
+    labels = np.where(energy >= np.percentile(energy, 70), "chorus", "verse").tolist()
+    if len(labels) > 2:
+        if energy[0] < 0.5:
+            labels[0] = "intro"
+        if energy[-1] < 0.5:
+            labels[-1] = "outro"
+    return SectionTable(starts, ends, labels, energy)
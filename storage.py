@@ -0,0 +1,187 @@
+import os
+import io
+import json
+import shutil
+import tempfile
+import threading
+
+DEFAULT_SONGS_PATH = "/Applications/XAMPP/xamppfiles/htdocs/rhythm_game_server/public/songs"
+
+
+# ========== BASE STORAGE ==========
+class Storage:
+    """Nơi lưu kết quả (beatmap, preview, waveform) theo đường dẫn tương đối 'safe_title/...'."""
+
+    def write_bytes(self, rel_path, data):
+        """Ghi dữ liệu, trả về vị trí đã lưu (đường dẫn file hoặc khóa trong bộ nhớ)."""
+        raise NotImplementedError
+
+    def read_bytes(self, rel_path):
+        raise NotImplementedError
+
+    def read_from(self, rel_path, offset):
+        """Đọc từ byte `offset` tới cuối (manifest chỉ nối thêm: đọc phần mới, không đọc lại cả file)."""
+        return self.read_bytes(rel_path)[offset:]
+
+    def exists(self, rel_path):
+        raise NotImplementedError
+
+    def delete(self, rel_path):
+        """Xóa nếu có (không lỗi khi chưa tồn tại)."""
+        raise NotImplementedError
+
+    def size(self, rel_path):
+        return len(self.read_bytes(rel_path))
+
+    def append_bytes(self, rel_path, data):
+        """Nối dữ liệu vào cuối file (manifest dạng JSON lines)."""
+        old = self.read_bytes(rel_path) if self.exists(rel_path) else b""
+        return self.write_bytes(rel_path, old + data)
+
+    def local_path(self, rel_path):
+        """Đường dẫn thật trên đĩa (cho yt-dlp / librosa cần file thật)."""
+        raise NotImplementedError
+
+    def import_file(self, src_path, rel_path):
+        """Đưa file audio đã tải vào storage, trả về đường dẫn có thể đọc được."""
+        raise NotImplementedError
+
+    def write_text(self, rel_path, text):
+        return self.write_bytes(rel_path, text.encode("utf-8"))
+
+    def write_json(self, rel_path, data):
+        return self.write_text(rel_path, json.dumps(data, ensure_ascii=False, indent=4))
+
+    def save_figure(self, rel_path, fig, **savefig_kwargs):
+        buf = io.BytesIO()
+        fig.savefig(buf, format=os.path.splitext(rel_path)[1].lstrip(".") or "png", **savefig_kwargs)
+        return self.write_bytes(rel_path, buf.getvalue())
+
+    def flush(self):
+        pass
+
+
+# ========== LOCAL FILESYSTEM ==========
+class LocalStorage(Storage):
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, rel_path=""):
+        return os.path.join(self.root, rel_path) if rel_path else self.root
+
+    def write_bytes(self, rel_path, data):
+        path = self.local_path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def read_bytes(self, rel_path):
+        with open(self.local_path(rel_path), "rb") as f:
+            return f.read()
+
+    def read_from(self, rel_path, offset):
+        with open(self.local_path(rel_path), "rb") as f:
+            f.seek(offset)
+            return f.read()
+
+    def exists(self, rel_path):
+        return os.path.exists(self.local_path(rel_path))
+
+    def delete(self, rel_path):
+        try:
+            os.remove(self.local_path(rel_path))
+        except FileNotFoundError:
+            pass
+
+    def size(self, rel_path):
+        return os.path.getsize(self.local_path(rel_path))
+
+    def append_bytes(self, rel_path, data):
+        # O_APPEND: các worker cùng nối dòng ngắn vào một file mà không ghi đè nhau
+        path = self.local_path(rel_path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(data)
+        return path
+
+    def import_file(self, src_path, rel_path):
+        target = self.local_path(rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(src_path) and os.path.abspath(src_path) != os.path.abspath(target):
+            os.rename(src_path, target)
+        return target
+
+
+# ========== IN-MEMORY (TESTS / BENCHMARKS) ==========
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.files = {}
+        self._lock = threading.Lock()
+        self._scratch = None
+
+    def local_path(self, rel_path=""):
+        # Thư mục tạm chỉ dùng cho các bước bắt buộc cần file thật (tải nhạc)
+        if self._scratch is None:
+            self._scratch = tempfile.mkdtemp(prefix="rhythm_ai_")
+        path = os.path.join(self._scratch, rel_path) if rel_path else self._scratch
+        os.makedirs(os.path.dirname(path) if rel_path else path, exist_ok=True)
+        return path
+
+    def write_bytes(self, rel_path, data):
+        with self._lock:
+            self.files[rel_path] = bytes(data)
+        return rel_path
+
+    def read_bytes(self, rel_path):
+        return self.files[rel_path]
+
+    def exists(self, rel_path):
+        return rel_path in self.files
+
+    def delete(self, rel_path):
+        with self._lock:
+            self.files.pop(rel_path, None)
+
+    def append_bytes(self, rel_path, data):
+        with self._lock:
+            self.files[rel_path] = self.files.get(rel_path, b"") + bytes(data)
+        return rel_path
+
+    def import_file(self, src_path, rel_path):
+        # Không di chuyển file gốc, chỉ giữ bản sao trong bộ nhớ
+        if os.path.exists(src_path):
+            with open(src_path, "rb") as f:
+                self.write_bytes(rel_path, f.read())
+        return src_path
+
+    def clear(self):
+        with self._lock:
+            self.files.clear()
+        if self._scratch is not None:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+            self._scratch = None
+
+
+# ========== CONFIG FROM ENVIRONMENT ==========
+_storage = None
+
+
+def storage_from_env():
+    backend = os.environ.get("RHYTHM_STORAGE", "local").lower()
+    if backend == "memory":
+        return MemoryStorage()
+    return LocalStorage(os.environ.get("LARAVEL_SONGS_PATH", DEFAULT_SONGS_PATH))
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = storage_from_env()
+    return _storage
+
+
+def set_storage(storage):
+    global _storage
+    _storage = storage
+    return storage
@@ -0,0 +1,297 @@
+import io
+import os
+import sys
+import json
+import random
+import numpy as np
+from storage import get_storage, set_storage, LocalStorage
+from hpss_stage import audio_fingerprint
+from segmentation import SectionTable
+from beatmap_generator import (analyze_audio, build_beatmap, finish_beatmap, save_preview_sheet, save_waveform_plot,
+                               sanitize_filename, effective_onset_engine, HOP_LENGTH)
+from downloader import download_audio
+
+ANALYSIS_VERSION = 2
+DIFFICULTIES = ("easy", "normal", "hard")
+# v0 / v1 / v2 lấy mẫu beat thưa dần theo độ khó
+DIFFICULTY_STEPS = {"easy": 3, "normal": 2, "hard": 1}
+
+
+# ========== STRATEGIES ==========
+class Strategy:
+    """Cách sinh nốt từ kết quả phân tích dùng chung. Đổi logic thì tăng `version` để bỏ cache cũ."""
+    name = "base"
+    aliases = ()
+    version = 1
+    lanes = True
+
+    def build(self, analysis, difficulty):
+        raise NotImplementedError
+
+
+class FixedPositionStrategy(Strategy):
+    """v0: mỗi phách một nốt, vị trí (x, y) lặp trái – phải – giữa, không random."""
+    name = "fixed"
+    aliases = ("v0",)
+    lanes = False
+    PATTERN = [(0.3, 0.7), (0.7, 0.7), (0.5, 0.4)]
+
+    def build(self, analysis, difficulty):
+        step = DIFFICULTY_STEPS[difficulty]
+        times, strength = analysis["grid_beats"][::step], analysis["grid_strength"][::step]
+        beats = []
+        for i, (t, e) in enumerate(zip(times, strength)):
+            x, y = self.PATTERN[i % len(self.PATTERN)]
+            beats.append({"time": round(float(t), 3), "energy": round(float(e), 3), "x": x, "y": y})
+        return {"difficulty": difficulty, "beats": beats}
+
+
+class CyclicLaneStrategy(Strategy):
+    """v1: lane xoay vòng 1→4 trên từng phách, phách mạnh có thể thành hold ngẫu nhiên."""
+    name = "cyclic"
+    aliases = ("v1",)
+
+    def build(self, analysis, difficulty):
+        step = DIFFICULTY_STEPS[difficulty]
+        times, strength = analysis["grid_beats"][::step], analysis["grid_strength"][::step]
+        beats = []
+        for i, (t, e) in enumerate(zip(times, strength)):
+            note = {"time": round(float(t), 3), "lane": (i % 4) + 1, "type": "tap", "energy": round(float(e), 3)}
+            if e > 0.75 and random.random() < 0.3:
+                note["type"] = "hold"
+                note["duration"] = round(float(random.uniform(0.3, 1.2)), 3)
+            beats.append(note)
+        return finish_beatmap({"difficulty": difficulty, "beats": beats})
+
+
+class ProbabilisticHoldStrategy(Strategy):
+    """v2: trên onset thật, hợp âm 2–3 nốt và hold theo xác suất của từng độ khó."""
+    name = "random_hold"
+    aliases = ("v2",)
+    PARAMS = {"easy": (0.05, 0.0, 0.15), "normal": (0.15, 0.05, 0.25), "hard": (0.3, 0.1, 0.35)}
+
+    def build(self, analysis, difficulty):
+        double_p, triple_p, hold_p = self.PARAMS[difficulty]
+        step = DIFFICULTY_STEPS[difficulty]
+        beats = []
+        for t, e in zip(analysis["beat_times"][::step], analysis["beat_strength"][::step]):
+            r = random.random()
+            if r < triple_p and e > 0.7:
+                count = 3
+            elif r < double_p + triple_p and e > 0.5:
+                count = 2
+            else:
+                count = 1
+            for lane in random.sample([1, 2, 3, 4], count):
+                note = {"time": round(float(t), 3), "lane": lane, "type": "tap", "energy": round(float(e), 3)}
+                if random.random() < hold_p and e > 0.6:
+                    note["type"] = "hold"
+                    note["duration"] = round(random.uniform(0.6, 1.5), 3)
+                beats.append(note)
+        return finish_beatmap({"difficulty": difficulty, "beats": beats})
+
+
+class SustainHoldStrategy(Strategy):
+    """v3: hold khi năng lượng RMS còn kéo dài sau onset."""
+    name = "sustain"
+    aliases = ("v3",)
+    version = 2
+
+    def build(self, analysis, difficulty):
+        return build_beatmap(analysis["beat_times"], analysis["beat_strength"], analysis["rms"],
+                             analysis["rms_times"], difficulty)
+
+
+class GridStrategy(Strategy):
+    """Bản hiện tại của beatmap_generator: lượng tử hóa theo phách, mật độ theo đoạn, lane theo pan."""
+    name = "grid"
+    aliases = ("v6", "default")
+    version = 2
+
+    def build(self, analysis, difficulty):
+        return build_beatmap(analysis["beat_times"], analysis["beat_strength"], analysis["rms"],
+                             analysis["rms_times"], difficulty, grid_beats=analysis["grid_beats"],
+                             sections=analysis["sections"], beat_pan=analysis["beat_pan"],
+                             sustain=analysis["sustain"])
+
+
+STRATEGIES = {cls.name: cls for cls in (FixedPositionStrategy, CyclicLaneStrategy, ProbabilisticHoldStrategy,
+                                        SustainHoldStrategy, GridStrategy)}
+_ALIASES = {alias: name for name, cls in STRATEGIES.items() for alias in cls.aliases}
+
+
+def get_strategy(name=None):
+    if isinstance(name, Strategy):
+        return name
+    name = name or GridStrategy.name
+    try:
+        return STRATEGIES[_ALIASES.get(name, name)]()
+    except KeyError:
+        raise ValueError(f"Không có strategy '{name}'. Chọn một trong: {', '.join(STRATEGIES)}")
+
+
+# ========== SHARED ENGINE ==========
+_ARRAY_FIELDS = ("beat_times", "beat_strength", "grid_beats", "grid_strength", "rms", "rms_times")
+_OPTIONAL_FIELDS = ("beat_pan", "sustain")
+
+
+class BeatmapEngine:
+    """Một lần decode + phân tích cho mọi strategy; kết quả phân tích và chart được cache trong storage.
+
+    Phân tích lưu ở <title>/cache/analysis_<mono|mc>[_hpss]_<onset engine>.npz, mỗi bộ tùy chọn một file
+    (khóa: nội dung file + ANALYSIS_VERSION + tùy chọn). Chart grid lưu ở <title>/beatmaps/ như API,
+    các strategy khác ở <title>/strategies/<strategy>/ (khóa thêm tên + version của strategy).
+    """
+
+    def __init__(self, audio_path, safe_title, multichannel=False, hpss=False, onset_engine=None):
+        self.audio_path = audio_path
+        self.safe_title = safe_title
+        # engine không áp dụng được (multichannel / hpss) thì bỏ khỏi khóa cache, tránh phân tích trùng
+        onset_engine = effective_onset_engine(onset_engine, multichannel, hpss)
+        self.options = {"multichannel": bool(multichannel), "hpss": bool(hpss), "onset_engine": onset_engine}
+        self.decodes = 0
+        self.previews = {}
+        self._analysis = None
+        self._key = None
+
+    @property
+    def key(self):
+        if self._key is None:
+            opts = ",".join(f"{k}={v}" for k, v in sorted(self.options.items()))
+            self._key = f"{audio_fingerprint(self.audio_path)}:{ANALYSIS_VERSION}:{opts}"
+        return self._key
+
+    @property
+    def analysis_path(self):
+        opts = self.options
+        name = "mc" if opts["multichannel"] else "mono"
+        name += "_hpss" if opts["hpss"] else ""
+        name += f"_{opts['onset_engine'] or 'default'}"
+        return f"{self.safe_title}/cache/analysis_{name}.npz"
+
+    # ---------- analysis ----------
+    def analysis(self):
+        if self._analysis is None:
+            self._analysis = self._load_analysis() or self._analyze()
+        return self._analysis
+
+    def _load_analysis(self):
+        storage, rel_path = get_storage(), self.analysis_path
+        if not storage.exists(rel_path):
+            return None
+        try:
+            cached = np.load(io.BytesIO(storage.read_bytes(rel_path)))
+            if str(cached["key"]) != self.key:
+                return None
+            analysis = {name: cached[name] for name in _ARRAY_FIELDS}
+            for name in _OPTIONAL_FIELDS:
+                analysis[name] = cached[name] if name in cached.files else None
+            analysis["tempo"] = float(cached["tempo"])
+            analysis["sections"] = SectionTable(cached["section_starts"], cached["section_ends"],
+                                                cached["section_labels"].tolist(), cached["section_energy"])
+        except Exception as e:
+            print(f"! Cache phân tích hỏng, tính lại: {e}")
+            return None
+        print(f"Dùng lại phân tích đã cache: {rel_path}")
+        return analysis
+
+    def _analyze(self):
+        hpss_cache = f"{self.safe_title}/cache/hpss.npz" if self.options["hpss"] else None
+        a = analyze_audio(self.audio_path, multichannel=self.options["multichannel"], hpss_cache=hpss_cache,
+                          onset_engine=self.options["onset_engine"])
+        self.decodes += 1
+
+        # độ mạnh onset tại từng phách (v0 / v1 sinh nốt trên phách)
+        frames = np.clip(np.rint(a["grid_beats"] * a["sr"] / HOP_LENGTH).astype(int), 0, len(a["onset_env"]) - 1)
+        strength = a["onset_env"][frames]
+        a["grid_strength"] = (strength - strength.min()) / (np.ptp(strength) + 1e-9) if len(strength) else strength
+
+        # waveform chỉ cần tín hiệu đầy đủ, vẽ ngay lúc decode rồi bỏ y
+        save_waveform_plot(a["y"], a["sr"], a["beat_times"], a["tempo"], self.safe_title)
+        analysis = {name: a[name] for name in _ARRAY_FIELDS + _OPTIONAL_FIELDS + ("tempo", "sections")}
+
+        sections = a["sections"]
+        extra = {name: a[name] for name in _OPTIONAL_FIELDS if a[name] is not None}
+        buf = io.BytesIO()
+        np.savez(buf, key=np.array(self.key), tempo=np.array(a["tempo"]),
+                 section_starts=sections.starts, section_ends=sections.ends,
+                 section_labels=np.array(sections.labels, dtype=str), section_energy=sections.energy,
+                 **{name: a[name] for name in _ARRAY_FIELDS}, **extra)
+        get_storage().write_bytes(self.analysis_path, buf.getvalue())
+        return analysis
+
+    # ---------- charts ----------
+    def chart_dir(self, strategy):
+        # chart grid là chart của API: /preview và catalog đọc ở <title>/beatmaps/
+        if strategy.name == GridStrategy.name:
+            return f"{self.safe_title}/beatmaps"
+        return f"{self.safe_title}/strategies/{strategy.name}"
+
+    def chart_path(self, strategy, difficulty):
+        return f"{self.chart_dir(strategy)}/{self.safe_title}_{difficulty}.json"
+
+    def chart(self, strategy, difficulty, force=False):
+        """Trả về (đường dẫn tương đối, beatmap); dùng lại chart đã lưu nếu khóa còn khớp."""
+        strategy = get_strategy(strategy)
+        storage, rel_path = get_storage(), self.chart_path(strategy, difficulty)
+        key = f"{self.key}:{strategy.name}:{strategy.version}"
+
+        if not force and storage.exists(rel_path):
+            data = json.loads(storage.read_bytes(rel_path))
+            if data.get("strategy", {}).get("key") == key:
+                return rel_path, data
+
+        data = strategy.build(self.analysis(), difficulty)
+        data["strategy"] = {"name": strategy.name, "version": strategy.version, "key": key}
+        output_path = storage.write_json(rel_path, data)
+        print(f"Đã lưu beatmap ({strategy.name}, {difficulty}) tại: {output_path}")
+        return rel_path, data
+
+    def run(self, strategies=None, difficulties=DIFFICULTIES, force=False):
+        """Sinh mọi cặp (strategy, độ khó) từ một lần phân tích; {strategy: {difficulty: beatmap}}.
+
+        Preview sheet của từng strategy có lane nằm trong self.previews[strategy].
+        """
+        results = {}
+        for name in strategies or (GridStrategy.name,):
+            strategy = get_strategy(name)
+            results[strategy.name] = {d: self.chart(strategy, d, force=force)[1] for d in difficulties}
+            if strategy.lanes:
+                rel_dir = None if strategy.name == GridStrategy.name else self.chart_dir(strategy)
+                self.previews[strategy.name] = save_preview_sheet(
+                    self.safe_title, results[strategy.name], sections=self.analysis()["sections"], rel_dir=rel_dir)
+        get_storage().flush()
+        return results
+
+
+# ========== LEGACY CLI (auto_beatmap_v0 – v3) ==========
+def legacy_main(strategies, banner, output_dir="downloads"):
+    """Luồng nhập link / file của các script auto_beatmap_v*, chạy trên engine chung."""
+    print(banner)
+    inp = input("👉 Nhập link YouTube hoặc đường dẫn file nhạc (.mp3/.wav): ").strip()
+
+    storage = set_storage(LocalStorage(output_dir))
+    if "youtube.com" in inp or "youtu.be" in inp:
+        audio_path = download_audio(inp, os.path.join(output_dir, "audio"))
+        song_title = os.path.splitext(os.path.basename(audio_path))[0]
+    else:
+        if not os.path.exists(inp):
+            print("❌ Không tìm thấy file nhạc!")
+            return None
+        song_title = sanitize_filename(os.path.splitext(os.path.basename(inp))[0])
+        audio_path = storage.import_file(inp, f"audio/{song_title}.mp3")
+
+    results = BeatmapEngine(audio_path, song_title).run(strategies)
+    print(f"\n✅ Hoàn tất! Xem kết quả trong thư mục '{output_dir}/{song_title}/'.")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Cách dùng: python strategies.py <file nhạc> [strategy ...]  (strategy: {', '.join(STRATEGIES)})")
+        sys.exit(1)
+    title = sanitize_filename(os.path.splitext(os.path.basename(sys.argv[1]))[0])
+    engine = BeatmapEngine(sys.argv[1], title)
+    for name, charts in engine.run(sys.argv[2:] or list(STRATEGIES)).items():
+        print(f"{name}: " + ", ".join(f"{d} {len(c['beats'])} nốt" for d, c in charts.items()))
+    print(f"Số lần decode: {engine.decodes}")
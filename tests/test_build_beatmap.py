@@ -0,0 +1,12 @@
+import numpy as np
+from beatmap_generator import build_beatmap
+
+
+def test_chart_without_onsets_is_still_validated_and_rated():
+    rms_times = np.arange(0, 10, 512 / 22050)
+    for difficulty in ("easy", "normal", "hard"):
+        data = build_beatmap(np.array([]), np.array([]), np.zeros_like(rms_times), rms_times, difficulty,
+                             grid_beats=np.arange(0.5, 10, 0.5))
+        assert data["beats"] == []
+        assert data["validation"] == {"lane_collisions": 0, "hold_overlaps": 0, "min_gap": 0, "chord_overload": 0}
+        assert data["rating"]["stars"] == 0.0
@@ -0,0 +1,87 @@
+import random
+
+import numpy as np
+
+from note_index import NoteIndex, validate_beatmap
+
+
+def tap(t, lane, energy=0.5):
+    return {"time": t, "lane": lane, "type": "tap", "energy": energy}
+
+
+def hold(t, lane, duration, energy=0.5):
+    return {"time": t, "lane": lane, "type": "hold", "energy": energy, "duration": duration}
+
+
+def test_taps_exactly_min_gap_apart_are_kept():
+    for start_ms in range(0, 20000, 7):
+        t = start_ms / 1000.0
+        data, report = validate_beatmap({"beats": [tap(t, 1), tap(round(t + 0.06, 3), 1)]})
+        assert len(data["beats"]) == 2, t
+        assert report == {"lane_collisions": 0, "hold_overlaps": 0, "min_gap": 0, "chord_overload": 0}
+
+
+def test_taps_closer_than_min_gap_drop_the_later_one():
+    data, report = validate_beatmap({"beats": [tap(1.0, 1), tap(1.059, 1)]})
+    assert [n["time"] for n in data["beats"]] == [1.0]
+    assert report["min_gap"] == 1
+
+
+def test_hold_is_clipped_before_next_note_in_lane():
+    data, report = validate_beatmap({"beats": [hold(1.0, 2, 1.0), tap(1.5, 2)]})
+    assert report["hold_overlaps"] == 1
+    assert data["beats"][0]["type"] == "hold"
+    assert data["beats"][0]["duration"] == 0.44
+
+
+def test_hold_clipped_below_min_hold_becomes_tap():
+    data, report = validate_beatmap({"beats": [hold(1.0, 2, 1.0), tap(1.3, 2)]})
+    assert report["hold_overlaps"] == 1
+    assert data["beats"][0]["type"] == "tap"
+    assert "duration" not in data["beats"][0]
+
+
+def test_chord_overload_ignores_hold_clipped_by_lane_repair():
+    # hold lane 1 bị cắt còn 0.44 s bởi nốt lúc 0.5 nên không còn giữ lúc 1.0
+    beats = [hold(0.0, 1, 2.0), tap(0.5, 1), tap(1.0, 2), tap(1.0, 3), tap(1.0, 4)]
+    data, report = validate_beatmap({"beats": beats})
+    assert report["chord_overload"] == 0
+    assert len(data["beats"]) == 5
+
+
+def test_chord_overload_ignores_hold_dropped_as_collision():
+    beats = [tap(0.0, 1), hold(0.0, 1, 2.0), tap(1.0, 2), tap(1.0, 3), tap(1.0, 4)]
+    data, report = validate_beatmap({"beats": beats})
+    assert report["lane_collisions"] == 1
+    assert report["chord_overload"] == 0
+    assert len(data["beats"]) == 4
+
+
+def test_chord_overload_drops_weakest_notes_while_hold_is_active():
+    beats = [hold(0.0, 1, 2.0), tap(1.0, 2, 0.9), tap(1.0, 3, 0.1), tap(1.0, 4, 0.5)]
+    data, report = validate_beatmap({"beats": beats})
+    assert report["chord_overload"] == 1
+    assert sorted(n["lane"] for n in data["beats"]) == [1, 2, 4]
+
+
+def test_overlapping_matches_brute_force():
+    rng = random.Random(0)
+    notes = []
+    for _ in range(300):
+        t = round(rng.uniform(0, 30), 3)
+        notes.append(hold(t, rng.randint(1, 4), round(rng.uniform(0.1, 3.0), 3)) if rng.random() < 0.4
+                     else tap(t, rng.randint(1, 4)))
+    index = NoteIndex(notes)
+    for _ in range(200):
+        lane, t0 = rng.randint(1, 4), round(rng.uniform(0, 30), 3)
+        t1 = round(t0 + rng.uniform(0, 2), 3)
+        expected = {i for i, n in enumerate(notes)
+                    if n["lane"] == lane and n["time"] <= t1 and n["time"] + n.get("duration", 0.0) >= t0}
+        assert set(index.overlapping(lane, t0, t1).tolist()) == expected
+
+
+def test_active_holds_counts_exact_ms_boundaries():
+    # 0.1 + 0.2 != 0.3 bằng float; hold kết thúc đúng lúc 0.3 không còn giữ tại 0.3
+    index = NoteIndex([hold(0.1, 1, 0.2), hold(0.2, 2, 0.5), tap(0.3, 3)])
+    assert index.active_holds([0.1, 0.15, 0.3, 0.7, 0.8]).tolist() == [0, 1, 1, 0, 0]
+    assert sorted(index.overlapping(1, 0.3, 0.3).tolist()) == [0]
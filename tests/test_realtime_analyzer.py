@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+import soundfile as sf
+
+from realtime_analyzer import analyze_file_stream
+
+SR = 22050
+CLICKS = np.arange(0.5, 5.5, 0.5)
+
+
+def write_clicks(path):
+    # nền là một nốt đàn liên tục (như nhạc thật, RMS trên ngưỡng năng lượng), click là burst nhiễu tắt nhanh
+    rng = np.random.default_rng(0)
+    t = np.arange(6 * SR) / SR
+    fade_in = 0.5 - 0.5 * np.cos(np.pi * np.minimum(t / 0.4, 1.0))
+    y = 0.1 * fade_in * np.sin(2 * np.pi * 220 * t) + 0.001 * rng.standard_normal(len(t))
+    burst = rng.standard_normal(int(0.05 * SR)) * np.exp(-np.arange(int(0.05 * SR)) / (0.01 * SR))
+    for click in CLICKS:
+        i = int(click * SR)
+        y[i:i + len(burst)] += 0.8 * burst
+    sf.write(path, y.astype(np.float32), SR)
+
+
+def charts(path, block_size):
+    random.seed(7)
+    return {d: beatmap for d, (beatmap, _) in analyze_file_stream(path, block_size=block_size).items()}
+
+
+def test_onsets_match_known_clicks(tmp_path):
+    path = str(tmp_path / "clicks.wav")
+    write_clicks(path)
+    for block_size in (512, 8192):
+        times = np.unique([n["time"] for n in charts(path, block_size)["hard"]["beats"]])
+        # onset được backtrack về cực tiểu envelope trước đỉnh (như librosa offline): có thể sớm vài khung
+        near = (times[None, :] >= CLICKS[:, None] - 0.1) & (times[None, :] <= CLICKS[:, None] + 0.03)
+        assert near.any(axis=1).all(), (block_size, times)
+        # ngoài click chỉ chấp nhận nốt lúc khởi động (trước click đầu, chưa biết biên độ envelope của bài)
+        assert np.all(times[~near.any(axis=0)] < CLICKS[0]), (block_size, times)
+
+def test_chart_does_not_depend_on_block_size(tmp_path):
+    path = str(tmp_path / "clicks.wav")
+    write_clicks(path)
+    reference = charts(path, 100000)
+    for block_size in (256, 1000, 4096):
+        assert charts(path, block_size) == reference, block_size